@@ -0,0 +1,228 @@
+"""
+Admission control: per-client rate limits and priority scheduling of requests
+
+    admission = AdmissionController(slots=8)
+    ticket = admission.acquire('ocr', client)   # raises Rejected
+    try:
+        ...
+    finally:
+        admission.release(ticket)
+
+Requests come in four classes, most urgent first: 'ocr' (gate writes),
+'status' (interactive lookups), 'list' (range queries, analytics) and 'bulk'
+(NDJSON streams and status batches, which hold on for minutes).
+
+Per-client rate limits are off unless asked for: given `rates[cls]`
+requests per second, each client gets a token bucket for the class with
+bursts of `bursts[cls]` (twice the rate when not given), and a request over
+it is rejected at once. Clients are told apart by whatever the caller
+passes, usually the remote address, so behind a proxy or NAT every client
+looks the same unless a trusted header names them.
+
+At most `slots` ocr, status and list requests run at a time. When they are
+all taken, requests wait in a bounded queue per class and a freed slot goes
+to the oldest waiter of the most urgent class. Status and list requests may
+only fill `shares[cls]` of the slots each and `slots - ocr_reserve` between
+them, so gate writes always find room however many lookups and scans pile
+up. Bulk requests do not take these slots; at most `bulk_slots` of them run
+at a time. A request finding its queue full is rejected at once; one that
+waits longer than `queue_timeout` is rejected with 503. Rejected carries the
+status and a Retry-After estimate.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metrics import REGISTRY
+from rate_limit import TokenBucket
+
+PRIORITIES = ('ocr', 'status', 'list', 'bulk')
+
+# per client and class: requests per second, 0 for no limit
+DEFAULT_RATES = {'ocr': 0.0, 'status': 0.0, 'list': 0.0, 'bulk': 0.0}
+# fraction of the slots each class may hold at once
+DEFAULT_SHARES = {'status': 0.5, 'list': 0.25}
+DEFAULT_MAX_QUEUE = {'ocr': 256, 'status': 64, 'list': 16, 'bulk': 16}
+
+ADMISSION_WAIT = REGISTRY.histogram('vbs_admission_wait_seconds', 'Time requests waited for a slot', ['priority'])
+ADMISSION_REJECTED = REGISTRY.counter('vbs_admission_rejected_total', 'Requests refused by admission control',
+                                      ['priority', 'reason'])
+
+
+class Rejected(Exception):
+    """Request refused; answer `status` with Retry-After `retry_after` seconds"""
+
+    def __init__(self, message, retry_after, status=429):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+        self.status = status
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """Per-client token buckets in front of a fixed number of slots handed out by priority"""
+
+    def __init__(self, slots=8, rates=None, bursts=None, shares=None, max_queue=None, queue_timeout=5.0,
+                 max_clients=10000, ocr_reserve=None, bulk_slots=4):
+        self.slots = slots
+        # slots status and list requests can never take, a quarter by default
+        self.ocr_reserve = max(1, slots // 4) if ocr_reserve is None else ocr_reserve
+        if not 0 < self.ocr_reserve < slots:
+            raise ValueError(f"ocr_reserve must be between 1 and slots - 1, got {self.ocr_reserve}")
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        bursts = bursts or {}
+        self.bursts = {cls: bursts.get(cls) or max(1, int(2 * self.rates[cls])) for cls in PRIORITIES}
+        shares = dict(DEFAULT_SHARES, **(shares or {}))
+        self.limits = {cls: min(slots - self.ocr_reserve, max(1, int(slots * shares[cls])))
+                       for cls in ('status', 'list')}
+        self.limits.update(ocr=slots, bulk=bulk_slots)
+        self.max_queue = dict(DEFAULT_MAX_QUEUE, **(max_queue or {}))
+        self.queue_timeout = queue_timeout
+        self.max_clients = max_clients
+
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._queues = {cls: deque() for cls in PRIORITIES}
+        self._running = dict.fromkeys(PRIORITIES, 0)
+        self._total = 0
+        # smoothed seconds a request of each class holds its slot, for Retry-After
+        self._hold = dict.fromkeys(PRIORITIES, 0.1)
+
+        self.admitted = dict.fromkeys(PRIORITIES, 0)
+        self.rate_limited = dict.fromkeys(PRIORITIES, 0)
+        self.queue_full = dict.fromkeys(PRIORITIES, 0)
+        self.timed_out = dict.fromkeys(PRIORITIES, 0)
+
+    def _bucket(self, cls, client):
+        # Caller must hold self._lock
+        key = (client, cls)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rates[cls], burst=self.bursts[cls])
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check_rate(self, cls, client):
+        """Take a token from the client's bucket for `cls`, raising Rejected (429) when there is none"""
+        if not self.rates[cls]:
+            return
+        with self._lock:
+            bucket = self._bucket(cls, client)
+        wait = bucket.try_acquire()
+        if wait:
+            with self._lock:
+                self.rate_limited[cls] += 1
+            ADMISSION_REJECTED.labels(priority=cls, reason='rate').inc()
+            raise Rejected(f"Rate limit exceeded for {cls} requests", max(1, math.ceil(wait)))
+
+    def acquire(self, cls, client=None):
+        """
+        Admit a request of class `cls` from `client`, waiting for a slot if needed
+
+        Returns the ticket to hand to release(). Raises Rejected when the client
+        is over its rate (429), the class queue is full (429) or no slot freed
+        up within queue_timeout (503).
+        """
+        self.check_rate(cls, client)
+        start = time.monotonic()
+        with self._lock:
+            # bulk requests have slots of their own, so only queue behind each other
+            ahead = (cls,) if cls == 'bulk' else PRIORITIES[:PRIORITIES.index(cls) + 1]
+            waiting_ahead = any(self._queues[c] for c in ahead)
+            if not waiting_ahead and self._has_slot(cls):
+                self._take(cls)
+                ADMISSION_WAIT.labels(priority=cls).observe(0.0)
+                return cls, start
+            queue = self._queues[cls]
+            if len(queue) >= self.max_queue[cls]:
+                self.queue_full[cls] += 1
+                retry_after = self._retry_after(cls)
+                waiter = None
+            else:
+                waiter = _Waiter()
+                queue.append(waiter)
+        if waiter is None:
+            ADMISSION_REJECTED.labels(priority=cls, reason='queue_full').inc()
+            raise Rejected(f"Too many {cls} requests waiting", retry_after)
+
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            if not waiter.granted:
+                queue.remove(waiter)
+                self.timed_out[cls] += 1
+                retry_after = self._retry_after(cls)
+        if not waiter.granted:
+            ADMISSION_REJECTED.labels(priority=cls, reason='timeout').inc()
+            raise Rejected(f"No capacity for {cls} requests", retry_after, status=503)
+        now = time.monotonic()
+        ADMISSION_WAIT.labels(priority=cls).observe(now - start)
+        return cls, now
+
+    def release(self, ticket):
+        """Free the slot of an admitted request and pass it to the most urgent waiter"""
+        cls, started = ticket
+        held = time.monotonic() - started
+        with self._lock:
+            self._hold[cls] += 0.1 * (held - self._hold[cls])
+            self._running[cls] -= 1
+            if cls != 'bulk':
+                self._total -= 1
+            for c in PRIORITIES:
+                queue = self._queues[c]
+                while queue and self._has_slot(c):
+                    waiter = queue.popleft()
+                    waiter.granted = True
+                    self._take(c)
+                    waiter.event.set()
+
+    def _has_slot(self, cls):
+        # Caller must hold self._lock
+        if self._running[cls] >= self.limits[cls]:
+            return False
+        if cls == 'bulk':
+            return True
+        if cls != 'ocr' and self._total - self._running['ocr'] >= self.slots - self.ocr_reserve:
+            return False
+        return self._total < self.slots
+
+    def _take(self, cls):
+        # Caller must hold self._lock
+        self._running[cls] += 1
+        if cls != 'bulk':
+            self._total += 1
+        self.admitted[cls] += 1
+
+    def _retry_after(self, cls):
+        # Caller must hold self._lock
+        return max(1, math.ceil((len(self._queues[cls]) + 1) * self._hold[cls] / self.limits[cls]))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "ocr_reserve": self.ocr_reserve,
+                "running": self._total,
+                "clients": len(self._buckets),
+                "classes": {cls: {
+                    "limit": self.limits[cls],
+                    "running": self._running[cls],
+                    "queued": len(self._queues[cls]),
+                    "admitted": self.admitted[cls],
+                    "rate_limited": self.rate_limited[cls],
+                    "queue_full": self.queue_full[cls],
+                    "timed_out": self.timed_out[cls],
+                    "hold_seconds": round(self._hold[cls], 4),
+                } for cls in PRIORITIES},
+            }
@@ -0,0 +1,388 @@
+"""
+Async (ASGI) serving mode for the VBS API
+
+    uvicorn async_api:app --port 5000
+
+Serves the same routes as start_api.py. The ULIP-bound routes (container
+status, arrival time update and batch status) are async and call ULIP through
+one shared httpx.AsyncClient (HTTP/2 when h2 is installed), with a concurrency
+limit and timeouts, so a slow upstream does not hold a worker per request. Those calls go through the same
+circuit breaker, retry budget and latency histograms as start_api.ulip_client,
+and the same per-client rate limits as start_api.admission; as they hold no
+worker while waiting, they take no admission slot. Every other route is served by the Flask app itself, mounted underneath.
+
+Needs starlette, httpx and an ASGI server such as uvicorn.
+"""
+import asyncio
+import functools
+import os
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import start_api
+from start_api import (
+    ADMISSION,
+    ADMISSION_CLIENT_HEADER,
+    ROUTE_PRIORITY,
+    ULIP_BASE_URL,
+    ULIPError,
+    admission,
+    apply_arrival_time_update,
+    batch_item_timeout,
+    bookings,
+    build_container_status,
+    details_cache,
+    details_flight,
+    extract_container_details,
+    record_trail,
+    resolve_batch_containers,
+    scheduled_details,
+    share_details,
+    shared_details,
+    stale_fallback,
+    token_manager,
+    ulip_client,
+)
+import http_pool
+import json_codec
+import metrics
+from metrics import span
+from admission import Rejected
+from start_api import HTTP_IN_FLIGHT, HTTP_REQUESTS, HTTP_SECONDS, METRICS
+from ulip_client import UPSTREAM_CALLS, CircuitOpenError
+
+ULIP_MAX_CONCURRENCY = int(os.environ.get('ULIP_MAX_CONCURRENCY', 64))
+ULIP_TIMEOUT = float(os.environ.get('ULIP_TIMEOUT', 10))
+# with the bookings, trails or shared state in SQLite, store calls wait on the
+# disk (and on group commits); they then run on a thread, not the event loop
+BLOCKING_STORES = bool(start_api.BOOKING_STORE or start_api.TRAIL_STORE or start_api.shared_state is not None)
+
+
+async def off_loop(fn, *args):
+    """fn(*args), on a worker thread when the stores can block"""
+    if BLOCKING_STORES:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+class AsyncULIPClient:
+    """Non-blocking LDB/01 calls sharing the token manager and details cache with start_api"""
+
+    def __init__(self, base_url=ULIP_BASE_URL, max_concurrency=ULIP_MAX_CONCURRENCY, timeout=ULIP_TIMEOUT):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client = None
+        self._semaphore = None
+        self._background = set()
+
+    async def start(self):
+        self._client = http_pool.async_client(self.max_concurrency, self.timeout)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def get_auth_token(self):
+        # Logging in is rare thanks to the token cache, so it stays on the sync client
+        return token_manager.peek() or await asyncio.to_thread(token_manager.get_token)
+
+    async def _post(self, endpoint, url, timeout=None, **kwargs):
+        """Async counterpart of ULIPClient.post, sharing its breaker, budget and histograms"""
+        timeout = httpx.Timeout(timeout or self.timeout, connect=ulip_client.connect_timeout)
+        attempt = 0
+        while True:
+            if not ulip_client.breaker.allow():
+                UPSTREAM_CALLS.labels(endpoint=endpoint, outcome='rejected').inc()
+                raise CircuitOpenError("ULIP circuit is open")
+            ulip_client.retry_budget.record_call()
+            error = None
+            start = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(url, timeout=timeout, **kwargs)
+            except httpx.HTTPError as e:
+                response, error = None, e
+            ulip_client.histogram(endpoint).observe(time.perf_counter() - start)
+
+            if response is not None and response.status_code < 500:
+                UPSTREAM_CALLS.labels(endpoint=endpoint, outcome='ok').inc()
+                ulip_client.breaker.record_success()
+                return response
+
+            UPSTREAM_CALLS.labels(endpoint=endpoint, outcome='error').inc()
+            ulip_client.breaker.record_failure()
+            attempt += 1
+            if attempt > ulip_client.max_retries or not ulip_client.retry_budget.try_spend():
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(ulip_client.backoff(attempt))
+
+    async def get_container_info(self, container_number, auth_token, timeout=None):
+        payload = {"containerNumber": container_number}
+        try:
+            for attempt in range(2):
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/json',
+                    'Authorization': auth_token
+                }
+                response = await self._post('ldb', f"{self.base_url}/LDB/01", timeout=timeout,
+                                            headers=headers, json=payload)
+                if response.status_code == 401 and attempt == 0:
+                    token_manager.invalidate(auth_token)
+                    auth_token = await asyncio.to_thread(token_manager.refresh, auth_token)
+                    if not auth_token:
+                        return None
+                    continue
+                response.raise_for_status()
+                return response.json()
+        except Exception as e:
+            print(f"Container info error: {str(e)}")
+            return None
+
+    async def fetch_container_details(self, container_number, timeout=None):
+        with span('ulip_auth'):
+            auth_token = await self.get_auth_token()
+        if not auth_token:
+            raise ULIPError("Failed to get authentication token", 'auth')
+
+        with span('ulip_ldb'):
+            container_data = await self.get_container_info(container_number, auth_token, timeout)
+        if not container_data:
+            raise ULIPError("Failed to get container information from API", 'info')
+
+        with span('extract_details'):
+            container_details = extract_container_details(container_data)
+        if not container_details:
+            raise ULIPError("Could not extract container details from API response", 'extract')
+        await off_loop(record_trail, container_number, container_data)
+        return container_details
+
+    async def get_container_details(self, container_number, fresh=False, timeout=None):
+        """Same caching rules as start_api.get_container_details"""
+        if fresh:
+            details_cache.count_bypass()
+        else:
+            value, revalidate = details_cache.lookup(container_number)
+            if value is not None:
+                if revalidate:
+                    task = asyncio.create_task(self._revalidate(container_number))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                return value
+
+        try:
+            return await details_flight.do_async(
+                (container_number, fresh), lambda: self._load_details(container_number, fresh, timeout))
+        except ULIPError:
+            last_known = stale_fallback(container_number, fresh)
+            if last_known is None:
+                raise
+            return last_known
+
+    async def _load_details(self, container_number, fresh, timeout):
+        if not fresh:
+            container_details = await off_loop(shared_details, container_number)
+            if container_details is not None:
+                details_cache.set(container_number, container_details)
+                return container_details
+        container_details = await self.fetch_container_details(container_number, timeout)
+        details_cache.set(container_number, container_details)
+        await off_loop(share_details, container_number, container_details)
+        return container_details
+
+    async def _revalidate(self, container_number):
+        try:
+            container_details = await off_loop(shared_details, container_number)
+            if container_details is None:
+                container_details = await self.fetch_container_details(container_number)
+                await off_loop(share_details, container_number, container_details)
+            details_cache.set(container_number, container_details)
+        except Exception as e:
+            print(f"Cache refresh error for {container_number}: {str(e)}")
+            details_cache.finish_refresh(container_number, False)
+        else:
+            details_cache.finish_refresh(container_number, True)
+
+
+ulip = AsyncULIPClient()
+
+
+def instrumented(route):
+    """Record the same request metrics and Server-Timing header as the Flask hooks"""
+    def decorator(endpoint):
+        if not METRICS:
+            return endpoint
+
+        @functools.wraps(endpoint)
+        async def wrapper(request):
+            start = time.perf_counter()
+            spans = metrics.start_request_spans()
+            in_flight = HTTP_IN_FLIGHT.labels(route=route)
+            in_flight.inc()
+            try:
+                response = await endpoint(request)
+            finally:
+                in_flight.dec()
+                metrics.end_request_spans()
+            labels = {'method': request.method, 'route': route, 'status': response.status_code}
+            HTTP_SECONDS.labels(**labels).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(**labels).inc()
+            if spans:
+                response.headers['Server-Timing'] = metrics.server_timing(spans)
+            return response
+        return wrapper
+    return decorator
+
+
+def rate_limited(endpoint):
+    """Apply start_api's per-client rate limit for the endpoint's class"""
+    priority = ROUTE_PRIORITY[endpoint.__name__]
+    if not ADMISSION:
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        client = request.headers.get(ADMISSION_CLIENT_HEADER) if ADMISSION_CLIENT_HEADER else None
+        try:
+            admission.check_rate(priority, client or (request.client.host if request.client else None))
+        except Rejected as e:
+            return JSONResponse({"error": e.message}, e.status, headers={'Retry-After': str(e.retry_after)})
+        return await endpoint(request)
+    return wrapper
+
+
+def json_body_response(request, body):
+    """Same ETag and compression negotiation as start_api.json_body_response"""
+    with span('encode'):
+        status, body, headers = json_codec.encode_body(
+            body, request.headers.get('accept-encoding'), request.headers.get('if-none-match'))
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+
+def wants_fresh(request):
+    cache_control = request.headers.get('Cache-Control', '').lower()
+    return 'no-cache' in cache_control or request.query_params.get('fresh') in ('1', 'true')
+
+
+@instrumented('/api/container/status/<container_number>')
+@rate_limited
+async def get_container_status(request):
+    container_number = request.path_params['container_number']
+    with span('booking_store'):
+        container = await off_loop(bookings.get, container_number)
+    if not container:
+        return JSONResponse({"error": "Container not found"}, 404)
+
+    fresh = wants_fresh(request)
+    container_details = None if fresh else scheduled_details(container_number)
+    if container_details is None:
+        try:
+            with span('container_details'):
+                container_details = await ulip.get_container_details(container_number, fresh=fresh)
+        except ULIPError as e:
+            return JSONResponse({"error": e.message}, 500)
+
+    with span('build_status'):
+        status = build_container_status(container, container_details)
+    return json_body_response(request, json_codec.dumps(status))
+
+
+@instrumented('/api/update_container_arrival_time/<container_number>')
+@rate_limited
+async def update_container_arrival_time(request):
+    container_number = request.path_params['container_number']
+    try:
+        container_details = await ulip.get_container_details(container_number, fresh=True)
+    except ULIPError as e:
+        return JSONResponse({"error": e.message}, {'auth': 500, 'info': 404, 'extract': 400}[e.stage])
+
+    container = await off_loop(bookings.get, container_number)
+    if not container:
+        return JSONResponse({"error": "Container not found in local storage"}, 404)
+
+    result = await off_loop(apply_arrival_time_update, container, container_details)
+    if result:
+        return JSONResponse(result, 200)
+    return JSONResponse({"error": "No timestamp found in API response"}, 400)
+
+
+@instrumented('/api/containers/status:batch')
+@rate_limited
+async def get_containers_status_batch(request):
+    try:
+        data = await request.json() or {}
+    except ValueError:
+        data = {}
+
+    try:
+        container_numbers = await off_loop(resolve_batch_containers, data)
+        item_timeout = batch_item_timeout(data)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+    fresh = bool(data.get('fresh')) or wants_fresh(request)
+    results = {}
+    errors = {}
+    containers = await off_loop(lambda: {n: bookings.get(n) for n in container_numbers})
+    # like start_api: each upstream call has item_timeout, and the deadline
+    # allows for waiting behind the others for a ULIP connection
+    rounds = -(-sum(1 for container in containers.values() if container) // ulip.max_concurrency)
+    deadline = item_timeout * max(rounds, 1) + 1
+
+    async def fetch(container_number):
+        container = containers[container_number]
+        if not container:
+            errors[container_number] = {"error": "Container not found", "status": 404}
+            return
+        try:
+            details = await asyncio.wait_for(
+                ulip.get_container_details(container_number, fresh, item_timeout), deadline)
+            results[container_number] = build_container_status(container, details)
+        except asyncio.TimeoutError:
+            errors[container_number] = {"error": "Timed out waiting for ULIP", "status": 504}
+        except ULIPError as e:
+            errors[container_number] = {"error": e.message, "status": 500}
+        except Exception as e:
+            errors[container_number] = {"error": str(e), "status": 500}
+
+    await asyncio.gather(*(fetch(n) for n in container_numbers))
+    return JSONResponse({"results": results, "errors": errors})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await ulip.start()
+    yield
+    await ulip.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/container/status/{container_number}', get_container_status, methods=['GET']),
+        Route('/api/update_container_arrival_time/{container_number}', update_container_arrival_time,
+              methods=['POST']),
+        Route('/api/containers/status:batch', get_containers_status_batch, methods=['POST']),
+        # everything else is local-only and served by the Flask app
+        Mount('/', app=WSGIMiddleware(start_api.app)),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,197 @@
+"""
+OCR gate write latency under saturating list and status traffic, with and without admission control
+
+    python benchmarks/bench_admission.py [--bookings 100000] [--days 7] [--list-clients 16]
+                                         [--status-clients 16] [--ulip-latency 2] [--ocr-rps 20]
+                                         [--list-rate 5] [--duration 10]
+
+Seeds a SQLite booking store, starts mock_ulip.py answering after
+--ulip-latency seconds and serves the API with the threaded Flask server
+(one thread per request, no gunicorn), then sends POST /api/ocr/update
+open-loop at --ocr-rps from one gate client while, each under its own
+X-Client-Id, --list-clients dashboard clients request GET /api/containers
+over --days of bookings and --status-clients request
+GET /api/container/status/<n>?fresh=1, each holding its slot for a ULIP
+call, back to back:
+
+    ocr alone       no list traffic, the baseline
+    admission off   ADMISSION=0: every request runs as soon as it arrives
+    admission on    the default slots and shares, and a per-client list rate
+                    of --list-rate per second
+
+Dashboard clients wait out Retry-After when refused, as well-behaved clients
+do. Reports OCR p50/p99 latency (measured from the scheduled send time) and
+list and status requests served and refused.
+"""
+import argparse
+import itertools
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_booking_store import SEASON_START, make_bookings
+from loadgen import ROOT, percentile, wait_until_up
+from sqlite_store import SQLiteBookingStore
+
+
+def serve(port, env):
+    command = [sys.executable, '-m', 'flask', '--app', 'start_api', 'run', '--port', str(port)]
+    return subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop(server):
+    try:
+        os.killpg(server.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    server.wait()
+
+
+def flood(base_url, path, clients, stop_event, name):
+    """Closed-loop GETs of path(client, n) from `clients` threads; returns (threads, {status: count})"""
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(i):
+        session = requests.Session()
+        session.headers['X-Client-Id'] = f"{name}-{i}"
+        for n in itertools.count():
+            if stop_event.is_set():
+                break
+            try:
+                response = session.get(base_url + path(i, n), timeout=60)
+                status = response.status_code
+            except requests.RequestException:
+                status, response = 'error', None
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+            if response is not None and response.status_code in (429, 503):
+                stop_event.wait(float(response.headers.get('Retry-After', 1)))
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    return threads, statuses
+
+
+def probe_ocr(base_url, containers, rps, duration):
+    """Open-loop OCR updates from one gate client; (latencies, {status: count})"""
+    local = threading.local()
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def send(i, scheduled):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+            session.headers['X-Client-Id'] = 'gate-1'
+        try:
+            status = session.post(f"{base_url}/api/ocr/update", timeout=30,
+                                  json={'container_number': containers[i % len(containers)]}).status_code
+        except requests.RequestException:
+            status = 'error'
+        with lock:
+            latencies.append(time.perf_counter() - scheduled)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        for i in range(int(rps * duration)):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, scheduled)
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR latency under list traffic")
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--list-clients', type=int, default=16)
+    parser.add_argument('--status-clients', type=int, default=16)
+    parser.add_argument('--ulip-latency', type=float, default=2, help="ULIP response time in seconds")
+    parser.add_argument('--ocr-rps', type=float, default=20)
+    parser.add_argument('--list-rate', type=float, default=5, help="per-client list requests per second")
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vbs-admission-')
+    bookings = make_bookings(args.bookings)
+    store = SQLiteBookingStore(os.path.join(workdir, 'bookings.db'))
+    store.add_many(bookings)
+    store.close()
+    containers = [b['container_number'] for b in bookings[:1000]]
+    start, end = SEASON_START + timedelta(days=60), SEASON_START + timedelta(days=60 + args.days)
+    list_path = f"/api/containers?start_time={start.isoformat()}&end_time={end.isoformat()}"
+    # a different container each time, so lookups are neither cached nor coalesced
+    lookups = [b['container_number'] for b in bookings[1000:]]
+
+    def list_request(i, n):
+        return list_path
+
+    def status_request(i, n):
+        return f"/api/container/status/{lookups[(i * 7919 + n) % len(lookups)]}?fresh=1"
+
+    mock_port, api_port = 5120, 5021
+    mock = subprocess.Popen([sys.executable, 'mock_ulip.py', '--port', str(mock_port),
+                             '--latency', str(args.ulip_latency)], cwd=ROOT, stdout=subprocess.DEVNULL)
+    runs = (('ocr alone', '1', False), ('admission off', '0', True), ('admission on', '1', True))
+    try:
+        wait_until_up(f"http://127.0.0.1:{mock_port}/__stats")
+        print(f"{os.cpu_count()} CPUs, {args.bookings} bookings, OCR at {args.ocr_rps:.0f}/s, "
+              f"{args.list_clients} list clients over {args.days} days, "
+              f"{args.status_clients} status clients with ULIP at {args.ulip_latency * 1e3:.0f} ms")
+        print(f"{'':<14} {'ocr p50 ms':>10} {'ocr p99 ms':>10} {'ocr errors':>10} "
+              f"{'list ok/s':>9} {'list refused':>12} {'status ok/s':>11} {'status refused':>14}")
+        for name, admission, loaded in runs:
+            env = dict(os.environ, ULIP_BASE_URL=f"http://127.0.0.1:{mock_port}/ulip/v1.0.0", ETA_REFRESH='0',
+                       BOOKING_STORE=os.path.join(workdir, 'bookings.db'), ADMISSION=admission,
+                       ADMISSION_CLIENT_HEADER='X-Client-Id', ADMISSION_RATE_LIST=str(args.list_rate))
+            server = serve(api_port, env)
+            base_url = f"http://127.0.0.1:{api_port}"
+            stop_event = threading.Event()
+            try:
+                wait_until_up(f"{base_url}/api/stats")
+                requests.get(base_url + list_path, timeout=30)
+                list_threads, list_statuses = flood(base_url, list_request, args.list_clients if loaded else 0,
+                                                    stop_event, 'dashboard')
+                status_threads, status_statuses = flood(base_url, status_request,
+                                                        args.status_clients if loaded else 0, stop_event, 'lookup')
+                time.sleep(1 + args.ulip_latency if loaded else 0)
+                started = time.perf_counter()
+                latencies, ocr_statuses = probe_ocr(base_url, containers, args.ocr_rps, args.duration)
+                wall = time.perf_counter() - started
+                stop_event.set()
+                for thread in list_threads + status_threads:
+                    thread.join()
+            finally:
+                stop_event.set()
+                stop(server)
+            ocr_errors = sum(count for status, count in ocr_statuses.items() if status != 200)
+            list_refused = sum(list_statuses.get(status, 0) for status in (429, 503))
+            status_refused = sum(status_statuses.get(status, 0) for status in (429, 503))
+            print(f"{name:<14} {percentile(latencies, 50) * 1e3:>10.1f} {percentile(latencies, 99) * 1e3:>10.1f} "
+                  f"{ocr_errors:>10} {list_statuses.get(200, 0) / wall:>9.1f} {list_refused:>12} "
+                  f"{status_statuses.get(200, 0) / wall:>11.1f} {status_refused:>14}")
+    finally:
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
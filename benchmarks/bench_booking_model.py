@@ -0,0 +1,95 @@
+"""
+Per-request time parsing with dict bookings versus Booking objects
+
+    python benchmarks/bench_booking_model.py [--bookings 100000] [--repeat 200000]
+
+Times, per call:
+
+    status times    what a status request does with times: the old code ran
+                    datetime.fromisoformat() on the booking's expected arrival
+                    and on ULIP's timestamp, the new code reads the epoch and
+                    looks the ULIP timestamp up in the memoized parser
+    cursor key      the paging cursor of a booking (to_epoch of booking_time
+                    before, an attribute now)
+    row strings     formatting a Booking's two listed times back to strings,
+                    the cost moved to the API edge; memoized, so the same
+                    1000 bookings again cost far less than 100000 distinct ones
+
+and the memory held per booking by each representation.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_booking_store import make_bookings
+from booking_store import Booking, to_epoch
+
+ULIP_TIMESTAMP = "2023-03-02 11:40:00"
+
+
+def per_call(fn, items, repeat):
+    n = len(items)
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(items[i % n])
+    return (time.perf_counter() - start) / repeat * 1e9
+
+
+def old_status(booking):
+    expected_time = datetime.fromisoformat(booking['expected_arrival_time'])
+    current_time = datetime.now()
+    api_expected_time = datetime.fromisoformat(ULIP_TIMESTAMP)
+    return (api_expected_time - expected_time).total_seconds() / 60, current_time > expected_time
+
+
+def new_status(booking):
+    expected_time = booking.expected_arrival_epoch
+    current_time = time.time()
+    api_expected_time = to_epoch(ULIP_TIMESTAMP)
+    return (api_expected_time - expected_time) / 60, current_time > expected_time
+
+
+def memory_per_booking(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Booking time parsing per request")
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200000)
+    args = parser.parse_args()
+
+    records = make_bookings(args.bookings)
+    models = [Booking.from_dict(record) for record in records]
+
+    print(f"{args.bookings} bookings, {args.repeat} calls each")
+    print(f"{'':<14} {'dict ns':>9} {'Booking ns':>11}")
+    rows = [
+        ('status times', per_call(old_status, records, args.repeat), per_call(new_status, models, args.repeat)),
+        ('cursor key', per_call(lambda b: to_epoch(b['booking_time']), records, args.repeat),
+         per_call(lambda b: b.booking_epoch, models, args.repeat)),
+        ('row strings', per_call(lambda b: (b['booking_time'], b['expected_arrival_time']), records, args.repeat),
+         per_call(lambda b: (b['booking_time'], b['expected_arrival_time']), models, args.repeat)),
+        ('  same 1000', per_call(lambda b: (b['booking_time'], b['expected_arrival_time']), records[:1000], args.repeat),
+         per_call(lambda b: (b['booking_time'], b['expected_arrival_time']), models[:1000], args.repeat)),
+    ]
+    for name, old, new in rows:
+        print(f"{name:<14} {old:>9.0f} {new:>11.0f}")
+
+    dict_bytes = memory_per_booking(lambda: make_bookings(args.bookings))
+    model_bytes = memory_per_booking(lambda: [Booking.from_dict(record) for record in records])
+    print(f"{'bytes/booking':<14} {dict_bytes:>9.0f} {model_bytes:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Compare BookingStore lookups with the original linear scans over a list
+
+    python benchmarks/bench_booking_store.py [--sizes 10000 100000 1000000]
+
+For each size it times a container_number lookup (the `next(...)` scan used by
+the routes) and a one-day booking_time window (the `get_containers` filter that
+re-parses every booking_time), against the indexed store.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_store import BookingStore
+
+SEASON_START = datetime(2023, 1, 1)
+SEASON_SECONDS = 180 * 24 * 3600
+
+
+def make_bookings(n, seed=42):
+    rng = random.Random(seed)
+    bookings = []
+    for i in range(n):
+        booking_time = SEASON_START + timedelta(seconds=rng.randrange(SEASON_SECONDS))
+        expected = booking_time + timedelta(minutes=rng.randrange(-240, 240))
+        bookings.append({
+            "container_number": f"BNCH{i:07d}",
+            "booking_time": booking_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "expected_arrival_time": expected.strftime("%Y-%m-%d %H:%M:%S"),
+            "new_expected_arrival_time": None,
+            "gate_arrival_time": None,
+            "status": "Pending",
+            "time_difference": None,
+        })
+    return bookings
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(n):
+    bookings = make_bookings(n)
+    build_start = time.perf_counter()
+    store = BookingStore(bookings)
+    build = time.perf_counter() - build_start
+
+    rng = random.Random(n)
+    targets = [bookings[rng.randrange(n)]["container_number"] for _ in range(50)]
+    window_start = SEASON_START + timedelta(days=90)
+    window_end = window_start + timedelta(days=1)
+    scan_repeat = 3 if n >= 1000000 else 10
+
+    def scan_lookup():
+        for number in targets[:5]:
+            next((c for c in bookings if c['container_number'] == number), None)
+
+    def store_lookup():
+        for number in targets:
+            store.get(number)
+
+    def scan_range():
+        return [c for c in bookings
+                if window_start <= datetime.fromisoformat(c['booking_time']) <= window_end]
+
+    def store_range():
+        return store.range('booking_time', window_start, window_end)
+
+    assert len(scan_range()) == len(store_range())
+    return {
+        "size": n,
+        "build_s": build,
+        "scan_lookup_us": timed(scan_lookup, scan_repeat) / 5 * 1e6,
+        "store_lookup_us": timed(store_lookup, 100) / len(targets) * 1e6,
+        "scan_range_ms": timed(scan_range, scan_repeat) * 1e3,
+        "store_range_ms": timed(store_range, 100) * 1e3,
+        "window_rows": len(store_range()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'size':>9} {'build s':>8} {'scan get us':>12} {'index get us':>13} "
+          f"{'scan range ms':>14} {'index range ms':>15} {'rows':>6}")
+    for n in args.sizes:
+        r = run(n)
+        print(f"{r['size']:>9} {r['build_s']:>8.2f} {r['scan_lookup_us']:>12.1f} {r['store_lookup_us']:>13.2f} "
+              f"{r['scan_range_ms']:>14.1f} {r['store_range_ms']:>15.3f} {r['window_rows']:>6}")
+
+
+if __name__ == '__main__':
+    main()
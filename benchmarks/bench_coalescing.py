@@ -0,0 +1,147 @@
+"""
+Concurrent lookups of one container and the ULIP calls they cost
+
+    python benchmarks/bench_coalescing.py [--clients 32] [--latency 0.2] [--rounds 3]
+
+Runs mock_ulip.py's server in-process with a fixed --latency and starts
+--clients lookups of the same container at once, --rounds times each:
+
+    status          GET /api/container/status/<n> with the details not cached
+    status fresh    the same with ?fresh=1
+    update          POST /api/update_container_arrival_time/<n>
+    async status    the async server's get_container_details, not cached
+
+and counts the LDB/01 calls ULIP received per round, with single-flight
+coalescing and, for the threaded routes, with it switched off. Exits with
+status 1 if a coalesced round made more than one call.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_ulip import PREFIX, MockULIPServer
+
+
+class NoFlight:
+    """Stands in for start_api.details_flight to show the uncoalesced behaviour"""
+
+    def do(self, key, fn):
+        return fn()
+
+    def stats(self):
+        return {}
+
+
+def concurrent_round(server, clients, call):
+    """Start `clients` calls together; (LDB calls made, wall seconds, status codes)"""
+    barrier = threading.Barrier(clients)
+
+    def one(_):
+        barrier.wait()
+        return call()
+
+    before = server.counts['ldb']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        statuses = list(pool.map(one, range(clients)))
+    return server.counts['ldb'] - before, time.perf_counter() - started, statuses
+
+
+def async_round(server, clients, ulip, container_number):
+    async def burst():
+        await ulip.start()
+        try:
+            await asyncio.gather(*(ulip.get_container_details(container_number) for _ in range(clients)))
+        finally:
+            await ulip.close()
+
+    before = server.counts['ldb']
+    started = time.perf_counter()
+    asyncio.run(burst())
+    return server.counts['ldb'] - before, time.perf_counter() - started, [200] * clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ULIP calls made by concurrent lookups of one container")
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.2, help="ULIP response time in seconds")
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    server = MockULIPServer(('127.0.0.1', 0), latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['ULIP_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}{PREFIX}"
+    os.environ['ETA_REFRESH'] = '0'
+    # every client has to be in flight at once, not queued for an admission slot
+    os.environ.setdefault('ADMISSION', '0')
+    os.environ.setdefault('ULIP_BATCH_WORKERS', str(args.clients))
+    import start_api
+    from async_api import ulip
+
+    client = start_api.app.test_client()
+    container_number = next(iter(start_api.bookings))['container_number']
+    # log in once so every round measures LDB/01 calls only
+    start_api.get_auth_token()
+
+    def status():
+        return client.get(f"/api/container/status/{container_number}").status_code
+
+    def status_fresh():
+        return client.get(f"/api/container/status/{container_number}?fresh=1").status_code
+
+    def update():
+        return client.post(f"/api/update_container_arrival_time/{container_number}").status_code
+
+    def uncached(call):
+        def run_round(_):
+            start_api.details_cache.invalidate(container_number)
+            return concurrent_round(server, args.clients, call)
+        return run_round
+
+    def async_uncached(_):
+        start_api.details_cache.invalidate(container_number)
+        return async_round(server, args.clients, ulip, container_number)
+
+    cases = [
+        ('status', uncached(status), True),
+        ('status fresh', uncached(status_fresh), True),
+        ('update', uncached(update), True),
+        ('async status', async_uncached, False),
+    ]
+
+    print(f"{args.clients} concurrent lookups of {container_number}, ULIP latency {args.latency * 1e3:.0f} ms")
+    print(f"{'':<14} {'coalescing':<10} {'ULIP calls/round':>16} {'wall ms':>8}")
+    failed = False
+    flight = start_api.details_flight
+    try:
+        for name, run_round, has_baseline in cases:
+            for enabled in (True, False) if has_baseline else (True,):
+                start_api.details_flight = flight if enabled else NoFlight()
+                calls, walls = [], []
+                for i in range(args.rounds):
+                    made, wall, statuses = run_round(i)
+                    if any(code != 200 for code in statuses):
+                        print(f"{name}: unexpected status codes {sorted(set(statuses))}")
+                        failed = True
+                    calls.append(made)
+                    walls.append(wall)
+                if enabled and max(calls) > 1:
+                    failed = True
+                print(f"{name:<14} {'on' if enabled else 'off':<10} {max(calls):>16} "
+                      f"{sum(walls) / len(walls) * 1e3:>8.0f}")
+    finally:
+        start_api.details_flight = flight
+        server.shutdown()
+
+    print(f"details_flight: {flight.stats()}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
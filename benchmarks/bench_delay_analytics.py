@@ -0,0 +1,94 @@
+"""
+Delay analytics over a million bookings
+
+    python benchmarks/bench_delay_analytics.py [--bookings 1000000] [--no-baseline]
+
+Generates a season of bookings where most have a ULIP estimate and half have
+arrived, then times building the NumPy columns once and a summary (on-time
+rate, percentiles, histogram, per-hour breakdown, top 20) over the whole
+season and over one week. The baseline computes just the season's delay
+percentiles the way the per-container code does, one fromisoformat() per
+booking field.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_booking_store import SEASON_START, make_bookings
+from delay_analytics import HAVE_NUMPY, BookingColumns
+
+
+def add_outcomes(bookings, seed=7):
+    rng = random.Random(seed)
+    for booking in bookings:
+        expected = datetime.fromisoformat(booking['expected_arrival_time'])
+        if rng.random() < 0.8:
+            booking['new_expected_arrival_time'] = (
+                expected + timedelta(minutes=rng.gauss(20, 60))).strftime("%Y-%m-%d %H:%M:%S")
+        if rng.random() < 0.5:
+            booking['gate_arrival_time'] = (
+                expected + timedelta(minutes=rng.expovariate(1 / 25) - 10)).isoformat(timespec='seconds')
+            booking['status'] = 'Arrived'
+
+
+def baseline(bookings, now):
+    delays = []
+    for booking in bookings:
+        expected = datetime.fromisoformat(booking['expected_arrival_time'])
+        if booking['status'] == 'Arrived':
+            reference = datetime.fromisoformat(booking['gate_arrival_time'])
+        else:
+            reference = now
+        delays.append(max(0.0, (reference - expected).total_seconds() / 60))
+    delays.sort()
+    return {p: delays[int((len(delays) - 1) * p / 100)] for p in (50, 90, 95, 99)}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized delay analytics benchmark")
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--no-baseline', action='store_true')
+    args = parser.parse_args()
+    if not HAVE_NUMPY:
+        sys.exit("NumPy is not installed")
+
+    bookings = make_bookings(args.bookings)
+    add_outcomes(bookings)
+    season_end = SEASON_START + timedelta(days=181)
+    week = (SEASON_START + timedelta(days=90), SEASON_START + timedelta(days=97))
+    now = SEASON_START + timedelta(days=200)
+
+    columns, build = timed(lambda: BookingColumns.from_bookings(bookings))
+    print(f"{args.bookings} bookings")
+    print(f"  build columns          {build * 1e3:8.1f} ms (once)")
+    for label, (start, end), bucket in (("season summary, by day", (SEASON_START, season_end), 'day'),
+                                        ("season summary, by hour", (SEASON_START, season_end), 'hour'),
+                                        ("one week, by hour", week, 'hour')):
+        columns.summary(start, end, bucket=bucket, now=now)
+        summary, elapsed = min((timed(lambda: columns.summary(start, end, bucket=bucket, now=now))
+                                for _ in range(5)), key=lambda r: r[1])
+        print(f"  {label:<24} {elapsed * 1e3:6.1f} ms  ({summary['bookings']} bookings, "
+              f"p90 delay {summary['delay_minutes']['p90']} min, on time {summary['on_time_rate']})")
+
+    upserts = bookings[:10000]
+    _, elapsed = timed(lambda: [columns.upsert(b) for b in upserts])
+    print(f"  upsert                 {elapsed / len(upserts) * 1e6:8.1f} us per booking")
+
+    if not args.no_baseline:
+        percentiles, elapsed = timed(lambda: baseline(bookings, now))
+        print(f"  baseline percentiles   {elapsed * 1e3:8.1f} ms (fromisoformat loop, p90 {percentiles[90]:.2f} min)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Connection reuse and latency of the pooled session against one call per connection
+
+    python benchmarks/bench_http_pool.py [--requests 500] [--threads 8] [--tls]
+
+Runs mock_ulip.py's server in-process (over HTTPS with a throwaway
+self-signed certificate when --tls is given, which needs openssl) and logs
+in, the call every ULIP lookup path starts with, --requests times:
+
+    per call      module-level requests.post, a new connection each time
+    pooled        http_pool.pooled_session() from one thread
+    pooled xN     the same session shared by --threads threads
+
+Reports connections opened, mean and p99 latency and calls per second.
+"""
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_pool
+from loadgen import percentile
+from mock_ulip import PREFIX, MockULIPServer
+
+
+def self_signed_context(workdir):
+    cert, key = os.path.join(workdir, 'cert.pem'), os.path.join(workdir, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=127.0.0.1',
+                    '-addext', 'subjectAltName=IP:127.0.0.1', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context, cert
+
+
+def run(post, count, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        post().raise_for_status()
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(count)))
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled versus per-call HTTP connections")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--tls', action='store_true', help="serve over HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vbs-http-')
+    server = MockULIPServer(('127.0.0.1', 0))
+    verify = True
+    scheme = 'http'
+    if args.tls:
+        context, verify = self_signed_context(workdir)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"{scheme}://127.0.0.1:{server.server_address[1]}{PREFIX}/user/login"
+    payload = {"username": "docker_usr", "password": "bench"}
+
+    try:
+        print(f"{args.requests} logins over {scheme}")
+        print(f"{'':<12} {'connections':>11} {'mean ms':>8} {'p99 ms':>8} {'calls/s':>8}")
+        per_call = lambda: requests.post(url, json=payload, verify=verify, timeout=10)
+        latencies, wall = run(per_call, args.requests, 1)
+        print(f"{'per call':<12} {args.requests:>11} {sum(latencies) / len(latencies) * 1e3:>8.2f} "
+              f"{percentile(latencies, 99) * 1e3:>8.2f} {len(latencies) / wall:>8.0f}")
+
+        for name, threads in (('pooled', 1), (f'pooled x{args.threads}', args.threads)):
+            session = http_pool.pooled_session(pool_maxsize=args.threads)
+            pooled = lambda: session.post(url, json=payload, verify=verify, timeout=10)
+            latencies, wall = run(pooled, args.requests, threads)
+            stats = http_pool.connection_stats(session)
+            print(f"{name:<12} {stats['connections']:>11} {sum(latencies) / len(latencies) * 1e3:>8.2f} "
+                  f"{percentile(latencies, 99) * 1e3:>8.2f} {len(latencies) / wall:>8.0f}")
+            session.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Bytes and latency of /api/containers responses by encoding
+
+    python benchmarks/bench_json_encoding.py [--bookings 100000] [--days 7] [--repeat 20]
+
+Serves a --days window of --bookings through the Flask test client and
+reports the body size and time per request for:
+
+    jsonify         the previous handler: a list of dicts through Flask's
+                    stdlib jsonify, uncompressed
+    stdlib          the current handler with JSON_ENCODER=json
+    orjson cold     orjson with an empty row cache
+    orjson          orjson with the rows already serialized
+    gzip, br        the same with Accept-Encoding
+    304             a client revalidating with If-None-Match
+
+The rows come from an in-memory booking store, so serialization dominates.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ETA_REFRESH', '0')
+# measures the handlers, not admission control
+os.environ.setdefault('ADMISSION', '0')
+os.environ.setdefault('METRICS', '0')
+
+from flask.json.provider import DefaultJSONProvider
+
+import json_codec
+import start_api
+from bench_booking_store import SEASON_START, make_bookings
+from booking_store import BookingStore
+from start_api import CONTAINER_LIST_FIELDS
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/containers encoding cost")
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    start_api.bookings = BookingStore(make_bookings(args.bookings))
+    start, end = SEASON_START + timedelta(days=60), SEASON_START + timedelta(days=60 + args.days)
+    url = f"/api/containers?start_time={start.isoformat()}&end_time={end.isoformat()}"
+    client = start_api.app.test_client()
+    stdlib_json = DefaultJSONProvider(start_api.app)
+
+    def previous():
+        rows = start_api.bookings.iter_range('booking_time', start, end)
+        with start_api.app.test_request_context():
+            return stdlib_json.response([{f: c.get(f) for f in CONTAINER_LIST_FIELDS} for c in rows]).get_data()
+
+    def get(headers=None):
+        return lambda: client.get(url, headers=headers or {}).get_data()
+
+    def cold(encoder):
+        def run():
+            json_codec.JSON_ENCODER = encoder
+            start_api.row_cache = json_codec.RowCache()
+            return client.get(url).get_data()
+        return run
+
+    rows = sum(1 for _ in start_api.bookings.iter_range('booking_time', start, end))
+    print(f"{rows} rows in a {args.days}-day window of {args.bookings} bookings, "
+          f"orjson {'installed' if json_codec.orjson else 'missing'}, "
+          f"brotli {'installed' if json_codec.brotli else 'missing'}")
+    print(f"{'':<12} {'bytes':>10} {'ms/request':>11}")
+
+    results = [('jsonify', timed(previous, args.repeat)), ('stdlib', timed(cold('json'), args.repeat))]
+    if json_codec.orjson is not None:
+        results.append(('orjson cold', timed(cold('orjson'), args.repeat)))
+    results.append(('orjson' if json_codec.orjson else 'stdlib warm', timed(get(), args.repeat)))
+    results.append(('gzip', timed(get({'Accept-Encoding': 'gzip'}), args.repeat)))
+    if json_codec.brotli is not None:
+        results.append(('br', timed(get({'Accept-Encoding': 'br'}), args.repeat)))
+    tag = client.get(url).headers['ETag']
+    results.append(('304', timed(get({'If-None-Match': tag, 'Accept-Encoding': 'br, gzip'}), args.repeat)))
+
+    for name, (elapsed, body) in results:
+        print(f"{name:<12} {len(body):>10} {elapsed * 1e3:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure the cost of the /metrics instrumentation
+
+    python benchmarks/bench_metrics.py [--requests 5000]
+
+Times the metric primitives on their own (counter increment, histogram
+observation, span) and then a cached /api/container/status/<n> request
+through the Flask test client with the request hooks on and off. ULIP is
+not called: the container's details are put in the cache beforehand.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ETA_REFRESH', '0')
+# measures the handlers, not admission control
+os.environ.setdefault('ADMISSION', '0')
+
+import metrics
+from metrics import Registry, span
+
+DETAILS = {
+    'cntrno': 'SEGU1257939',
+    'timestamptimezone': '2023-02-12T18:40:00',
+    'eventname': 'Gate In',
+    'currentlocation': 'Nhava Sheva',
+    'latitude': '18.95',
+    'longitude': '72.95',
+}
+
+
+def per_op(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_primitives(repeat):
+    registry = Registry()
+    counter = registry.counter('bench_total', 'bench', ['route'])
+    histogram = registry.histogram('bench_seconds', 'bench', ['route'])
+    child = histogram.labels(route='/api/containers')
+
+    def run_span():
+        with span('bench'):
+            pass
+
+    results = {
+        'counter.labels().inc()': per_op(lambda: counter.labels(route='/api/containers').inc(), repeat),
+        'histogram child observe()': per_op(lambda: child.observe(0.003), repeat),
+        'histogram.labels().observe()': per_op(lambda: histogram.labels(route='/api/containers').observe(0.003), repeat),
+        'span()': per_op(run_span, repeat),
+    }
+    for name, seconds in results.items():
+        print(f"  {name:<30} {seconds * 1e9:8.0f} ns")
+
+    for _ in range(100):
+        histogram.labels(route=f'/r{_}').observe(0.01)
+    render = per_op(registry.render, 100)
+    print(f"  {'render (101 histogram series)':<30} {render * 1e3:8.2f} ms")
+
+
+def bench_requests(n):
+    import start_api
+
+    container_number = 'SEGU1257939'
+    start_api.details_cache.set(container_number, DETAILS)
+    client = start_api.app.test_client()
+    url = f'/api/container/status/{container_number}'
+
+    def run(enabled):
+        start_api.METRICS = enabled
+        for _ in range(200):
+            client.get(url)
+        start = time.perf_counter()
+        for _ in range(n):
+            client.get(url)
+        return (time.perf_counter() - start) / n
+
+    # alternate so drift affects both modes alike
+    off, on = [], []
+    for _ in range(3):
+        off.append(run(False))
+        on.append(run(True))
+    off, on = min(off), min(on)
+    print(f"  hooks off  {off * 1e6:8.1f} us/request")
+    print(f"  hooks on   {on * 1e6:8.1f} us/request")
+    print(f"  overhead   {(on - off) * 1e6:8.1f} us/request ({(on - off) / off * 100:.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--repeat', type=int, default=200000, help='iterations per primitive')
+    parser.add_argument('--requests', type=int, default=5000, help='requests per round and mode')
+    args = parser.parse_args()
+
+    print("Metric primitives")
+    bench_primitives(args.repeat)
+    print(f"Cached status request, {args.requests} requests x 3 rounds")
+    bench_requests(args.requests)
+
+
+if __name__ == '__main__':
+    main()
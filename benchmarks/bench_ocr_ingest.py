@@ -0,0 +1,106 @@
+"""
+Events per second through OCR gate ingestion
+
+    python benchmarks/bench_ocr_ingest.py [--containers 20000] [--repeats 3] [--store sqlite|memory]
+
+Each of --containers booked containers is read --repeats times by its gate,
+as OCR cameras do while a truck passes. Compares:
+
+    per-event   one POST /api/ocr/update per read, each applied on its own
+    batched     POST /api/ocr/events with 500 reads per request, deduped and
+                applied in bulk by the ingestion consumer
+
+Both go through the Flask test client against a fresh booking store; the
+batched time runs until the queue has been applied.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ETA_REFRESH', '0')
+# measures the handlers, not admission control
+os.environ.setdefault('ADMISSION', '0')
+os.environ.setdefault('METRICS', '0')
+
+import start_api
+from booking_store import BookingStore
+from ocr_ingest import iso6346_check_digit
+from sqlite_store import SQLiteBookingStore
+
+BATCH = 500
+
+
+def container_number(i):
+    code = f"BNCU{i:06d}"
+    return f"{code}{iso6346_check_digit(code)}"
+
+
+def make_bookings(n):
+    return [{
+        "container_number": container_number(i),
+        "booking_time": "2023-03-01 08:00:00",
+        "expected_arrival_time": "2023-03-01 10:00:00",
+        "new_expected_arrival_time": None,
+        "gate_arrival_time": None,
+        "status": "Pending",
+        "time_difference": None,
+    } for i in range(n)]
+
+
+def make_store(kind, bookings, workdir, name):
+    if kind == 'memory':
+        return BookingStore(bookings)
+    return SQLiteBookingStore(os.path.join(workdir, f'{name}.db'), bookings)
+
+
+def reads(n, repeats):
+    # a gate reads each container several times in a row
+    return [{"container_number": container_number(i), "gate_id": f"G{i % 8}", "confidence": 0.97}
+            for i in range(n) for _ in range(repeats)]
+
+
+def run_per_event(client, events):
+    start = time.perf_counter()
+    for event in events:
+        client.post('/api/ocr/update', json={"container_number": event["container_number"]})
+    return time.perf_counter() - start
+
+
+def run_batched(client, events):
+    start = time.perf_counter()
+    for i in range(0, len(events), BATCH):
+        while True:
+            response = client.post('/api/ocr/events', json={"events": events[i:i + BATCH]})
+            if response.status_code != 503:
+                break
+            time.sleep(0.01)
+    start_api.ocr_ingestor.drain()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR ingestion throughput")
+    parser.add_argument('--containers', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--store', choices=['sqlite', 'memory'], default='sqlite')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vbs-ocr-')
+    bookings = make_bookings(args.containers)
+    events = reads(args.containers, args.repeats)
+    client = start_api.app.test_client()
+    print(f"{args.containers} containers x {args.repeats} reads = {len(events)} events, {args.store} store")
+
+    for name, run in (('per-event', run_per_event), ('batched', run_batched)):
+        start_api.bookings = make_store(args.store, [dict(b) for b in bookings], workdir, name)
+        elapsed = run(client, events)
+        arrived = sum(1 for b in start_api.bookings if b['status'] == 'Arrived')
+        print(f"  {name:<10} {elapsed:7.2f} s  {len(events) / elapsed:9.0f} events/s  {arrived} arrived")
+    print(f"  ingest stats {start_api.ocr_ingestor.stats()}")
+
+
+if __name__ == '__main__':
+    main()
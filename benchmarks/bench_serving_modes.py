@@ -0,0 +1,103 @@
+"""
+Compare the Flask (WSGI) and async (ASGI) serving modes against a mock ULIP
+
+    python benchmarks/bench_serving_modes.py [--latency 0.2] [--concurrency 64] [--duration 10]
+
+Starts mock_ulip.py with the given upstream latency, then runs each server
+mode in turn and drives /api/container/status/<n>?fresh=1 (so every request
+goes upstream) from a pool of client threads. Reports requests/second and
+p50/p99 latency per mode.
+
+The Flask mode runs under gunicorn with sync workers when gunicorn is
+installed, otherwise on the threaded development server. The async mode needs
+uvicorn.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from loadgen import CONTAINERS, ROOT, api_command, percentile, wait_until_up
+
+
+def drive(base_url, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker(i):
+        session = requests.Session()
+        n = i
+        while time.time() < stop_at:
+            container = CONTAINERS[n % len(CONTAINERS)]
+            n += 1
+            start = time.perf_counter()
+            try:
+                ok = session.get(f"{base_url}/api/container/status/{container}?fresh=1", timeout=30).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask vs async serving mode load test")
+    parser.add_argument('--latency', default='0.2', help="mock ULIP latency distribution")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn sync workers for the Flask mode")
+    parser.add_argument('--modes', nargs='+', default=['flask', 'async'])
+    args = parser.parse_args()
+
+    mock_port, api_port = 5100, 5001
+    env = dict(os.environ, ULIP_BASE_URL=f"http://127.0.0.1:{mock_port}/ulip/v1.0.0")
+    # measures raw throughput, not what the admission slots let through
+    env.setdefault('ADMISSION', '0')
+    mock = subprocess.Popen([sys.executable, 'mock_ulip.py', '--port', str(mock_port),
+                             '--latency', args.latency], cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{mock_port}/__stats")
+        print(f"{'mode':>6} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in args.modes:
+            server = subprocess.Popen(api_command(mode, api_port, args.workers), cwd=ROOT, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                base_url = f"http://127.0.0.1:{api_port}"
+                wait_until_up(f"{base_url}/api/stats")
+                r = drive(base_url, args.concurrency, args.duration)
+                print(f"{mode:>6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8.1f} "
+                      f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Insert, lookup and OCR update throughput of SQLiteBookingStore
+
+    python benchmarks/bench_sqlite_store.py [--size 1000000] [--path /tmp/bench_bookings.db]
+
+Bulk loads `size` synthetic bookings, then measures random container lookups,
+one-day booking_time windows, and OCR gate updates issued by many threads at
+once (group commit) against the same number issued one at a time (one commit
+per event).
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_booking_store import SEASON_START, make_bookings
+from sqlite_store import SQLiteBookingStore
+
+
+def ocr_updates(store, numbers, threads):
+    """Apply one gate event per container number from `threads` threads; returns events/s"""
+    chunks = [numbers[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        for number in chunk:
+            store.update(number, gate_arrival_time=datetime.now().isoformat(), status='Arrived')
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return len(numbers) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLiteBookingStore throughput")
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--path', default='/tmp/bench_bookings.db')
+    parser.add_argument('--events', type=int, default=2000)
+    args = parser.parse_args()
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)
+
+    bookings = make_bookings(args.size)
+    store = SQLiteBookingStore(args.path)
+    start = time.perf_counter()
+    store.add_many(bookings)
+    insert_s = time.perf_counter() - start
+    print(f"bulk insert     {args.size / insert_s:>12,.0f} rows/s  ({insert_s:.1f} s for {args.size:,})")
+
+    rng = random.Random(1)
+    numbers = [bookings[rng.randrange(args.size)]['container_number'] for _ in range(20000)]
+    start = time.perf_counter()
+    for number in numbers:
+        store.get(number)
+    print(f"lookup          {len(numbers) / (time.perf_counter() - start):>12,.0f} gets/s")
+
+    windows = [SEASON_START + timedelta(days=rng.randrange(170)) for _ in range(50)]
+    start = time.perf_counter()
+    rows = sum(len(store.range('booking_time', w, w + timedelta(days=1))) for w in windows)
+    elapsed = time.perf_counter() - start
+    print(f"1-day window    {len(windows) / elapsed:>12,.1f} queries/s  ({rows // len(windows)} rows each)")
+
+    events = numbers[:args.events]
+    sequential = ocr_updates(store, events, 1)
+    store_stats = store.stats()
+    grouped = ocr_updates(store, events, 32)
+    after = store.stats()
+    print(f"OCR sequential  {sequential:>12,.0f} events/s  ({store_stats['commits']} commits)")
+    print(f"OCR 32 threads  {grouped:>12,.0f} events/s  "
+          f"({after['commits'] - store_stats['commits']} commits for {len(events)} events)")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Import-time startup budget of the desktop client and the API servers
+
+    python benchmarks/bench_startup.py [--runs 7] [--top 8] [--budget vbs_application=60 ...]
+
+Imports each module --runs times in a fresh interpreter under
+`python -X importtime` and reports the median cumulative import time, the
+heaviest modules it imports directly, and any module on its lazy list that
+got imported anyway:
+
+    vbs_application   the kiosk client; requests loads on the network pool
+                      after the window is up
+    start_api         Flask server; requests loads with the first ULIP call,
+                      NumPy with the first /api/analytics/delays request
+    async_api         the same behind Starlette
+
+Exits with status 1 when a module is over its budget (ms) or loaded a lazy
+module at import, so it can run as a regression check before a release.
+Interpreter startup itself (site, encodings) is not counted.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module: (budget in ms, modules it must not import at startup)
+BUDGETS = {
+    'vbs_application': (60, ('requests', 'urllib3')),
+    'start_api': (250, ('requests', 'urllib3', 'numpy')),
+    'async_api': (400, ('requests', 'urllib3', 'numpy')),
+}
+
+
+def import_profile(module):
+    """(cumulative µs per imported module, {module: direct child cumulative µs}, loaded modules) of one import"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    code = f"import sys; import {module}; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    cumulative, children, pending = {}, {}, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, micros, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        cumulative[name] = int(micros)
+        # importtime lists a module after everything it imported, one level deeper
+        while pending and pending[-1][0] > depth:
+            d, child = pending.pop()
+            if name == module and d == depth + 1:
+                children[child] = cumulative[child]
+        pending.append((depth, name))
+    return cumulative, children, set(result.stdout.split())
+
+
+def measure(module, runs):
+    totals, profile = [], None
+    for _ in range(runs):
+        cumulative, children, loaded = import_profile(module)
+        totals.append(cumulative[module])
+        profile = children, loaded
+    return statistics.median(totals) / 1000, min(totals) / 1000, profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import time against a budget")
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=8, help="direct imports to list per module")
+    parser.add_argument('--budget', action='append', default=[], metavar='MODULE=MS',
+                        help="override or add a module's budget")
+    parser.add_argument('modules', nargs='*', help="modules to measure (default: all with a budget)")
+    args = parser.parse_args()
+
+    budgets = {module: ms for module, (ms, _) in BUDGETS.items()}
+    for item in args.budget:
+        module, _, ms = item.partition('=')
+        budgets[module] = float(ms)
+
+    failed = False
+    for module in args.modules or list(budgets):
+        median, best, (children, loaded) = measure(module, args.runs)
+        budget = budgets.get(module)
+        eager = sorted(name for name in BUDGETS.get(module, (None, ()))[1] if name in loaded)
+        over = budget is not None and median > budget
+        failed = failed or over or bool(eager)
+        verdict = 'over budget' if over else 'ok'
+        print(f"{module}: {median:.1f} ms median, {best:.1f} ms best of {args.runs} "
+              f"(budget {budget if budget is not None else '-'} ms, {verdict})")
+        for child, micros in sorted(children.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {child:<28} {micros / 1000:>7.1f} ms")
+        if eager:
+            print(f"    imported at startup, should be lazy: {', '.join(eager)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Throughput of the status and list routes as worker processes are added
+
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--bookings 100000] [--duration 10]
+
+Seeds a SQLite booking store, starts mock_ulip.py, then for each worker count
+serves the API in multi-worker mode (BOOKING_STORE plus SHARED_STATE) and
+drives, closed-loop from several client processes:
+
+    status  GET /api/container/status/<n> for a few hundred booked containers
+    list    GET /api/containers?limit=100 over one day of bookings
+
+The async mode runs under uvicorn --workers; --mode flask needs gunicorn.
+Every container is fetched once before the timed runs. The ULIP logins and
+LDB/01 calls made during each run are reported too: since the token and the
+details are shared, they should stay near zero whatever the worker count.
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_booking_store import SEASON_START, make_bookings
+from loadgen import ROOT, api_command, percentile, upstream_counts, wait_until_up
+from sqlite_store import SQLiteBookingStore
+
+STATUS_CONTAINERS = 300
+LIST_START = SEASON_START + timedelta(days=90)
+LIST_END = LIST_START + timedelta(days=1)
+
+
+def client(args):
+    base_url, scenario, containers, duration, threads = args
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        n = offset
+        while time.time() < stop_at:
+            if scenario == 'status':
+                url = f"{base_url}/api/container/status/{containers[n % len(containers)]}"
+            else:
+                url = f"{base_url}/api/containers?limit=100&start_time={LIST_START}&end_time={LIST_END}"
+            n += threads
+            start = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=30).ok
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors[0] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors[0]
+
+
+def drive(base_url, scenario, containers, duration, clients, threads):
+    with multiprocessing.Pool(clients) as pool:
+        started = time.perf_counter()
+        results = pool.map(client, [(base_url, scenario, containers, duration, threads)] * clients)
+        wall = time.perf_counter() - started
+    latencies = [x for lat, _ in results for x in lat]
+    return {
+        "requests": len(latencies),
+        "errors": sum(e for _, e in results),
+        "rps": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+    }
+
+
+def warm_up(base_url, containers):
+    """Fetch every container once so the timed runs measure serving, not ULIP"""
+    session = requests.Session()
+    with ThreadPoolExecutor(32) as pool:
+        list(pool.map(lambda n: session.get(f"{base_url}/api/container/status/{n}", timeout=30), containers))
+
+
+def serve(mode, port, workers, env):
+    command = api_command(mode, port, workers)
+    if mode == 'async':
+        command += ['--workers', str(workers)]
+    # own process group, so the workers go down with their supervisor
+    return subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop(server):
+    try:
+        os.killpg(server.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Status and list throughput by worker count")
+    parser.add_argument('--mode', choices=['async', 'flask'], default='async')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4, help="client processes")
+    parser.add_argument('--threads', type=int, default=8, help="threads per client process")
+    args = parser.parse_args()
+    if args.mode == 'flask' and not importlib.util.find_spec('gunicorn'):
+        parser.error("the flask mode needs gunicorn for several workers")
+
+    workdir = tempfile.mkdtemp(prefix='vbs-workers-')
+    bookings = make_bookings(args.bookings)
+    store = SQLiteBookingStore(os.path.join(workdir, 'bookings.db'))
+    store.add_many(bookings)
+    store.close()
+    containers = [b['container_number'] for b in bookings[:STATUS_CONTAINERS]]
+
+    mock_port, api_port = 5110, 5011
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen([sys.executable, 'mock_ulip.py', '--port', str(mock_port), '--latency', '0.05'],
+                            cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"{mock_url}/__stats")
+        print(f"{os.cpu_count()} CPUs, {args.bookings} bookings, {args.mode} mode")
+        print(f"{'workers':>7} {'route':>6} {'requests':>9} {'errors':>7} {'req/s':>8} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'logins':>7} {'ldb':>5}")
+        for workers in args.workers:
+            shared = os.path.join(workdir, f'shared-{workers}.db')
+            env = dict(os.environ, ULIP_BASE_URL=f"{mock_url}/ulip/v1.0.0", ETA_REFRESH='0',
+                       BOOKING_STORE=os.path.join(workdir, 'bookings.db'), SHARED_STATE=shared)
+            # measures raw throughput, not what the admission slots let through
+            env.setdefault('ADMISSION', '0')
+            server = serve(args.mode, api_port, workers, env)
+            try:
+                base_url = f"http://127.0.0.1:{api_port}"
+                wait_until_up(f"{base_url}/api/stats", timeout=60)
+                warm_up(base_url, containers)
+                for scenario in ('status', 'list'):
+                    before = upstream_counts(mock_url)
+                    r = drive(base_url, scenario, containers, args.duration, args.clients, args.threads)
+                    after = upstream_counts(mock_url)
+                    print(f"{workers:>7} {scenario:>6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8.1f} "
+                          f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                          f"{after.get('login', 0) - before.get('login', 0):>7} "
+                          f"{after.get('ldb', 0) - before.get('ldb', 0):>5}")
+            finally:
+                stop(server)
+    finally:
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
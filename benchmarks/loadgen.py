@@ -0,0 +1,232 @@
+"""
+Load generator for the VBS API against the local mock ULIP
+
+    python benchmarks/loadgen.py [--mode flask|async] [--rps 50] [--duration 10]
+                                 [--latency lognormal:0.2,0.5] [--error-rate 0.01]
+                                 [--compare benchmarks/results/<earlier>.json]
+
+Starts mock_ulip.py and the API (or uses --base-url/--mock-url for servers
+that are already running), then drives each scenario in turn at a fixed
+arrival rate:
+
+    containers  GET  /api/containers over the whole season
+    status      GET  /api/container/status/<n>
+    ocr         POST /api/ocr/update
+
+Requests are issued open-loop on a schedule, and latency is measured from the
+scheduled send time so a stalled server cannot hide its queueing delay. For
+each scenario it reports throughput, p50/p95/p99 latency, errors and the ULIP
+calls it caused, and writes everything to benchmarks/results/ as JSON so runs
+can be compared between commits with --compare.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+CONTAINERS = ["SEGU1257939", "SSMU2151610", "TSLU3052136", "TRHU3282355", "CAXU8093913"]
+
+
+def scenario_request(name, i):
+    """(method, path, json body) for the i-th request of a scenario"""
+    container = CONTAINERS[i % len(CONTAINERS)]
+    if name == 'containers':
+        return 'GET', '/api/containers?start_time=2022-01-01 00:00:00&end_time=2024-01-01 00:00:00', None
+    if name == 'status':
+        return 'GET', f'/api/container/status/{container}', None
+    if name == 'ocr':
+        return 'POST', '/api/ocr/update', {'container_number': container}
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+SCENARIOS = ('containers', 'status', 'ocr')
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def api_command(mode, port, workers=4):
+    """Command line that serves the API in the given mode"""
+    if mode == 'async':
+        return [sys.executable, '-m', 'uvicorn', 'async_api:app', '--port', str(port),
+                '--log-level', 'warning']
+    if importlib.util.find_spec('gunicorn'):
+        return [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                '--log-level', 'warning', 'start_api:app']
+    return [sys.executable, '-m', 'flask', '--app', 'start_api', 'run', '--port', str(port)]
+
+
+def upstream_counts(mock_url):
+    if not mock_url:
+        return {}
+    try:
+        return requests.get(f"{mock_url}/__stats", timeout=2).json()
+    except requests.RequestException:
+        return {}
+
+
+def run_scenario(base_url, name, rps, duration, max_workers=256, mock_url=None, make_request=None):
+    """Drive one scenario open-loop at `rps` for `duration` seconds"""
+    make_request = make_request or scenario_request
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(i, scheduled):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, path, body = make_request(name, i)
+        try:
+            status = session.request(method, base_url + path, json=body, timeout=30).status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    before = upstream_counts(mock_url)
+    total = int(rps * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, scheduled)
+    wall = time.perf_counter() - started
+    after = upstream_counts(mock_url)
+
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        "scenario": name,
+        "target_rps": rps,
+        "requests": total,
+        "throughput_rps": round(ok / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1e3, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1e3, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1e3, 2),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "upstream_calls": {k: after.get(k, 0) - before.get(k, 0) for k in after},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(report):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(RESULTS_DIR, f"loadgen-{stamp}-{report['revision']}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def print_results(results, baseline=None):
+    previous = {r['scenario']: r for r in (baseline or {}).get('results', [])}
+    print(f"{'scenario':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}  upstream")
+    for r in results:
+        errors = sum(v for k, v in r['statuses'].items() if not k.isdigit() or int(k) >= 400)
+        line = (f"{r['scenario']:>10} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} "
+                f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {errors:>7}  {r['upstream_calls']}")
+        old = previous.get(r['scenario'])
+        if old:
+            line += f"  (p99 {r['p99_ms'] - old['p99_ms']:+.1f} ms, req/s {r['throughput_rps'] - old['throughput_rps']:+.1f})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the VBS API")
+    parser.add_argument('--mode', choices=['flask', 'async'], default='flask')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--rps', type=float, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--latency', default='0.1', help="mock ULIP latency distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--token-ttl', type=float, default=None)
+    parser.add_argument('--base-url', help="use an already running API instead of starting one")
+    parser.add_argument('--mock-url', help="mock ULIP to read upstream call counts from")
+    parser.add_argument('--compare', help="earlier results JSON to show deltas against")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    processes = []
+    base_url, mock_url = args.base_url, args.mock_url
+    try:
+        if not base_url:
+            mock_port, api_port = 5100, 5001
+            mock_url = f"http://127.0.0.1:{mock_port}"
+            mock_cmd = [sys.executable, 'mock_ulip.py', '--port', str(mock_port),
+                        '--latency', args.latency, '--error-rate', str(args.error_rate)]
+            if args.token_ttl:
+                mock_cmd += ['--token-ttl', str(args.token_ttl)]
+            processes.append(subprocess.Popen(mock_cmd, cwd=ROOT, stdout=subprocess.DEVNULL))
+            wait_until_up(f"{mock_url}/__stats")
+
+            env = dict(os.environ, ULIP_BASE_URL=f"{mock_url}/ulip/v1.0.0")
+            # measures raw throughput, not what the admission slots let through
+            env.setdefault('ADMISSION', '0')
+            processes.append(subprocess.Popen(api_command(args.mode, api_port), cwd=ROOT, env=env,
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            base_url = f"http://127.0.0.1:{api_port}"
+            wait_until_up(f"{base_url}/api/stats")
+
+        results = [run_scenario(base_url, name, args.rps, args.duration, mock_url=mock_url)
+                   for name in args.scenarios]
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if not args.no_save:
+        report = {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "config": vars(args),
+            "results": results,
+        }
+        print(f"Saved {save_results(report)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# Fields of a booking record
+BOOKING_FIELDS = (
+    'container_number',
+    'booking_time',
+    'expected_arrival_time',
+    'new_expected_arrival_time',
+    'gate_arrival_time',
+    'status',
+    'time_difference',
+)
+
+# Time fields and the Booking attributes holding them as epoch seconds
+TIME_FIELDS = {
+    'booking_time': 'booking_epoch',
+    'expected_arrival_time': 'expected_arrival_epoch',
+    'new_expected_arrival_time': 'new_expected_arrival_epoch',
+    'gate_arrival_time': 'gate_arrival_epoch',
+}
+
+# Fields kept in sorted (epoch, container_number) indexes for range queries
+INDEXED_TIME_FIELDS = ('booking_time', 'expected_arrival_time')
+
+# Zone of timestamps without an offset (booking times are naive); the server's own when unset
+BOOKING_TZ = ZoneInfo(os.environ['BOOKING_TZ']) if os.environ.get('BOOKING_TZ') else None
+
+# Formats ULIP has been seen to use besides ISO 8601
+ULIP_TIME_FORMATS = ('%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d-%b-%Y %H:%M:%S', '%d-%m-%Y %H:%M')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_MAX_KEY = '\U0010ffff'
+
+
+def _timestamp(value):
+    if value.tzinfo is None and BOOKING_TZ is not None:
+        value = value.replace(tzinfo=BOOKING_TZ)
+    return value.timestamp()
+
+
+@lru_cache(maxsize=65536)
+def parse_timestamp(text):
+    """
+    Epoch seconds for a booking or ULIP timestamp string, raising ValueError
+
+    Timestamps with an offset are converted exactly; naive ones are read in
+    BOOKING_TZ. The same strings come back on every request, so results are
+    memoized.
+    """
+    try:
+        return _timestamp(datetime.fromisoformat(text))
+    except ValueError:
+        pass
+    for fmt in ULIP_TIME_FORMATS:
+        try:
+            return _timestamp(datetime.strptime(text, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised timestamp: {text!r}")
+
+
+@lru_cache(maxsize=65536)
+def format_timestamp(epoch):
+    """Naive BOOKING_TZ string for epoch seconds, as bookings are written"""
+    moment = datetime.fromtimestamp(epoch, BOOKING_TZ).replace(tzinfo=None, microsecond=0)
+    # isoformat is several times cheaper than strftime(TIME_FORMAT) and gives the same string
+    return moment.isoformat(' ')
+
+
+def utc_offset(epoch=None):
+    """Seconds BOOKING_TZ is ahead of UTC at `epoch` (now when omitted)"""
+    moment = datetime.fromtimestamp(time.time() if epoch is None else epoch, timezone.utc)
+    return moment.astimezone(BOOKING_TZ).utcoffset().total_seconds()
+
+
+def to_epoch(value):
+    """Epoch seconds for an ISO string, datetime or number, None when missing"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return parse_timestamp(value.strip())
+    return _timestamp(value)
+
+
+def _epoch_int(value):
+    epoch = to_epoch(value)
+    return None if epoch is None else int(epoch)
+
+
+class Booking:
+    """
+    One booking, with its times held as integer epoch seconds
+
+    Times are parsed once when the booking is loaded or changed; indexing a
+    booking like a dict (booking['booking_time'], get(), dict(booking))
+    formats them back to strings, which only the API responses need.
+    """
+
+    __slots__ = ('container_number', 'booking_epoch', 'expected_arrival_epoch', 'new_expected_arrival_epoch',
+                 'gate_arrival_epoch', 'status', 'time_difference')
+
+    def __init__(self, container_number, booking_epoch=None, expected_arrival_epoch=None,
+                 new_expected_arrival_epoch=None, gate_arrival_epoch=None, status='Pending', time_difference=None):
+        self.container_number = container_number
+        self.booking_epoch = booking_epoch
+        self.expected_arrival_epoch = expected_arrival_epoch
+        self.new_expected_arrival_epoch = new_expected_arrival_epoch
+        self.gate_arrival_epoch = gate_arrival_epoch
+        self.status = status
+        self.time_difference = time_difference
+
+    @classmethod
+    def from_dict(cls, record):
+        """Booking from a record of BOOKING_FIELDS with string, datetime or epoch times"""
+        if isinstance(record, Booking):
+            return record
+        booking = cls(record['container_number'], status=record.get('status') or 'Pending',
+                      time_difference=record.get('time_difference'))
+        for field, attribute in TIME_FIELDS.items():
+            setattr(booking, attribute, _epoch_int(record.get(field)))
+        return booking
+
+    def epoch(self, field):
+        return getattr(self, TIME_FIELDS[field])
+
+    def set(self, field, value):
+        """Change one field; times may be strings, datetimes or epoch seconds"""
+        if field in TIME_FIELDS:
+            setattr(self, TIME_FIELDS[field], _epoch_int(value))
+        elif field in BOOKING_FIELDS:
+            setattr(self, field, value)
+        else:
+            raise KeyError(f"Unknown booking field: {field}")
+
+    def __getitem__(self, field):
+        if field in TIME_FIELDS:
+            epoch = getattr(self, TIME_FIELDS[field])
+            return None if epoch is None else format_timestamp(epoch)
+        if field in BOOKING_FIELDS:
+            return getattr(self, field)
+        raise KeyError(field)
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return BOOKING_FIELDS
+
+    def to_dict(self):
+        return {field: self[field] for field in BOOKING_FIELDS}
+
+    def __repr__(self):
+        return f"Booking({self.to_dict()!r})"
+
+
+class BookingStore:
+    """
+    In-memory booking records with indexes
+
+    Records are Booking objects, looked up by a hash index on container_number
+    and by sorted indexes on the booking and expected-arrival epochs, so a
+    time window costs O(log n + k). Records must be changed through update()
+    so the indexes stay in step.
+    """
+
+    def __init__(self, bookings=()):
+        self._lock = threading.RLock()
+        self._by_number = {}
+        self._time_index = {field: [] for field in INDEXED_TIME_FIELDS}
+
+        # Bulk load: append everything, then sort each index once
+        for booking in bookings:
+            booking = Booking.from_dict(booking)
+            self._by_number[booking.container_number] = booking
+        for booking in self._by_number.values():
+            for field, index in self._time_index.items():
+                epoch = booking.epoch(field)
+                if epoch is not None:
+                    index.append((epoch, booking.container_number))
+        for index in self._time_index.values():
+            index.sort()
+
+    def __len__(self):
+        return len(self._by_number)
+
+    def __contains__(self, container_number):
+        return container_number in self._by_number
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._by_number.values()))
+
+    def get(self, container_number):
+        """Booking record for a container number, or None"""
+        return self._by_number.get(container_number)
+
+    def add(self, booking):
+        """Insert a new booking, replacing any existing one for the same container"""
+        booking = Booking.from_dict(booking)
+        with self._lock:
+            container_number = booking.container_number
+            if container_number in self._by_number:
+                self._unindex(self._by_number[container_number])
+            self._by_number[container_number] = booking
+            self._index(booking)
+
+    def remove(self, container_number):
+        with self._lock:
+            booking = self._by_number.pop(container_number, None)
+            if booking is not None:
+                self._unindex(booking)
+            return booking
+
+    def update(self, container_number, **changes):
+        """Apply field changes to a booking, re-indexing changed time fields"""
+        with self._lock:
+            booking = self._by_number.get(container_number)
+            if booking is None:
+                return None
+            for field, value in changes.items():
+                if field in self._time_index and booking.epoch(field) != _epoch_int(value):
+                    self._unindex_field(booking, field)
+                    booking.set(field, value)
+                    self._index_field(booking, field)
+                else:
+                    booking.set(field, value)
+            return booking
+
+    def update_many(self, updates):
+        """Apply (container_number, changes) pairs; returns the updated records, None where missing"""
+        return [self.update(container_number, **changes) for container_number, changes in updates]
+
+    def range(self, field, start, end):
+        """Bookings whose `field` lies in [start, end], in time order"""
+        return list(self.iter_range(field, start, end))
+
+    def iter_range(self, field, start, end, after=None):
+        """
+        Yield bookings whose `field` lies in [start, end], in time order
+
+        `after` is an (epoch, container_number) key; only bookings sorting
+        strictly after it are returned, which is how paging resumes.
+        """
+        index = self._time_index[field]
+        with self._lock:
+            lo = bisect_left(index, (to_epoch(start), ''))
+            if after is not None:
+                lo = max(lo, bisect_right(index, tuple(after)))
+            hi = bisect_right(index, (to_epoch(end), _MAX_KEY))
+            keys = index[lo:hi]
+        for _, container_number in keys:
+            booking = self._by_number.get(container_number)
+            if booking is not None:
+                yield booking
+
+    def stats(self):
+        return {"bookings": len(self)}
+
+    def _index(self, booking):
+        for field in self._time_index:
+            self._index_field(booking, field)
+
+    def _unindex(self, booking):
+        for field in self._time_index:
+            self._unindex_field(booking, field)
+
+    def _index_field(self, booking, field):
+        epoch = booking.epoch(field)
+        if epoch is not None:
+            insort(self._time_index[field], (epoch, booking.container_number))
+
+    def _unindex_field(self, booking, field):
+        epoch = booking.epoch(field)
+        if epoch is None:
+            return
+        index = self._time_index[field]
+        key = (epoch, booking.container_number)
+        i = bisect_left(index, key)
+        if i < len(index) and index[i] == key:
+            del index[i]
@@ -0,0 +1,188 @@
+import heapq
+import random
+import threading
+import time
+
+from rate_limit import TokenBucket
+
+# (arriving within this many seconds, refresh every this many seconds)
+DEFAULT_TIERS = (
+    (2 * 3600, 5 * 60),
+    (12 * 3600, 15 * 60),
+    (None, 60 * 60),
+)
+
+
+class ETARefreshScheduler:
+    """
+    Background refresh of ULIP arrival estimates for upcoming bookings
+
+    Every `scan_interval` seconds the bookings whose expected_arrival_time falls
+    between `past_grace` seconds ago and `horizon` seconds ahead are scheduled.
+    Each is refreshed through `refresh(booking)` more often the closer it is to
+    its slot (see DEFAULT_TIERS). All refreshes share one token bucket of
+    `rate` calls per second toward ULIP. A failed refresh is retried after an
+    exponential, jittered backoff.
+
+    With several worker processes, `leader` is a callable (e.g.
+    shared_state.Lease.held) that is True in the one process that should run
+    the refreshes; the others check it every `leader_check` seconds.
+    """
+
+    def __init__(self, bookings, refresh, horizon=48 * 3600, past_grace=2 * 3600, tiers=DEFAULT_TIERS,
+                 rate=2.0, scan_interval=60, retry_base=30, max_backoff=3600, leader=None, leader_check=5):
+        self.bookings = bookings
+        self._refresh = refresh
+        self.horizon = horizon
+        self.past_grace = past_grace
+        self.tiers = tiers
+        self.scan_interval = scan_interval
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self.limiter = TokenBucket(rate, burst=max(1, int(rate)))
+        self.leader = leader
+        self.leader_check = leader_check
+        self._leading = False
+
+        self._lock = threading.Lock()
+        self._heap = []
+        self._due = {}
+        self._failures = {}
+        self._refreshed = {}
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.refreshes = 0
+        self.failures = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='eta-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def refresh_interval(self, seconds_to_arrival):
+        for within, interval in self.tiers:
+            if within is None or seconds_to_arrival <= within:
+                return interval
+        return self.tiers[-1][1]
+
+    def is_current(self, container_number):
+        """True if the scheduler refreshed this container within its refresh interval"""
+        with self._lock:
+            refreshed = self._refreshed.get(container_number)
+        # allow for the jitter on the next refresh
+        return refreshed is not None and time.time() - refreshed[0] <= refreshed[1] * 1.2
+
+    def scan(self, now=None):
+        """Schedule bookings inside the horizon and forget those that left it"""
+        now = now or time.time()
+        seen = set()
+        for booking in self.bookings.iter_range('expected_arrival_time', now - self.past_grace, now + self.horizon):
+            if booking.get('status') == 'Arrived':
+                continue
+            container_number = booking['container_number']
+            seen.add(container_number)
+            with self._lock:
+                if container_number not in self._due:
+                    # spread the first round so a new scan does not burst
+                    self._schedule(container_number, now + random.uniform(0, self.scan_interval))
+        with self._lock:
+            for container_number in list(self._due):
+                if container_number not in seen:
+                    del self._due[container_number]
+                    self._failures.pop(container_number, None)
+                    self._refreshed.pop(container_number, None)
+
+    def _schedule(self, container_number, due):
+        # Caller must hold self._lock; older heap entries are skipped when popped
+        self._due[container_number] = due
+        heapq.heappush(self._heap, (due, container_number))
+
+    def _next_due(self):
+        with self._lock:
+            while self._heap:
+                due, container_number = self._heap[0]
+                if self._due.get(container_number) == due:
+                    return due, container_number
+                heapq.heappop(self._heap)
+            return None, None
+
+    def _run(self):
+        next_scan = 0
+        while not self._stop.is_set():
+            self._leading = self.leader is None or self.leader()
+            if not self._leading:
+                next_scan = 0
+                self._stop.wait(self.leader_check)
+                continue
+
+            now = time.time()
+            if now >= next_scan:
+                try:
+                    self.scan(now)
+                except Exception as e:
+                    print(f"ETA scan error: {str(e)}")
+                next_scan = now + self.scan_interval
+
+            due, container_number = self._next_due()
+            if due is None or due > now:
+                wait = next_scan - now if due is None else min(due, next_scan) - now
+                if self.leader is not None:
+                    # keep renewing the lease while idle
+                    wait = min(wait, self.leader_check)
+                self._wakeup.wait(max(wait, 0))
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                heapq.heappop(self._heap)
+            if not self.limiter.acquire(stop=self._stop):
+                return
+            self.refresh_one(container_number)
+
+    def refresh_one(self, container_number):
+        booking = self.bookings.get(container_number)
+        if booking is None or booking.get('status') == 'Arrived':
+            with self._lock:
+                self._due.pop(container_number, None)
+            return
+
+        now = time.time()
+        try:
+            self._refresh(booking)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                failures = self._failures[container_number] = self._failures.get(container_number, 0) + 1
+                delay = min(self.max_backoff, self.retry_base * 2 ** (failures - 1)) * random.uniform(0.5, 1.5)
+                if container_number in self._due:
+                    self._schedule(container_number, now + delay)
+            print(f"ETA refresh error for {container_number}: {str(e)}")
+            return
+
+        interval = self.refresh_interval(booking.expected_arrival_epoch - now)
+        with self._lock:
+            self.refreshes += 1
+            self._failures.pop(container_number, None)
+            self._refreshed[container_number] = (now, interval)
+            if container_number in self._due:
+                self._schedule(container_number, now + interval * random.uniform(0.9, 1.1))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "leader": self._thread is not None and self._leading,
+                "tracked": len(self._due),
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "backing_off": len(self._failures),
+            }
@@ -0,0 +1,94 @@
+import itertools
+import queue
+import threading
+
+
+class Subscription:
+    """One subscriber's bounded queue of events, optionally limited to a booking window"""
+
+    def __init__(self, bus, start=None, end=None, max_queue=1000):
+        self._bus = bus
+        self.start = start
+        self.end = end
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        # publishers take turns, so the slot freed for an event is not taken by another
+        self._offer_lock = threading.Lock()
+
+    def matches(self, event):
+        epoch = event.get('booking_epoch')
+        if epoch is None:
+            return True
+        return (self.start is None or self.start <= epoch) and (self.end is None or epoch <= self.end)
+
+    def offer(self, event):
+        with self._offer_lock:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                # a slow reader loses its oldest events rather than stalling publishers
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.dropped += 1
+                self.queue.put_nowait(event)
+
+    def get(self, timeout=None):
+        """Next event, or None if none arrived within `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for container status changes
+
+    Publishers never block: each subscriber has its own bounded queue and a
+    reader that falls behind drops its oldest events.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, start=None, end=None, max_queue=1000):
+        """Subscribe to events for bookings whose booking epoch is in [start, end]"""
+        subscription = Subscription(self, start, end, max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type, **data):
+        """Send an event to every matching subscriber; returns the event"""
+        event = dict(data, type=event_type, id=next(self._ids))
+        with self._lock:
+            self.published += 1
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            # one bad subscription must not fail the write that published the event
+            try:
+                if subscription.matches(event):
+                    subscription.offer(event)
+            except Exception as e:
+                print(f"Event delivery error: {str(e)}")
+        return event
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscriptions),
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subscriptions),
+            }
@@ -0,0 +1,62 @@
+"""
+Pooled keep-alive HTTP clients shared by the API server and the desktop app
+
+    session = pooled_session(pool_maxsize=16)
+    session.post(url, json=payload)
+    connection_stats(session)   # {"requests": 120, "connections": 3, ...}
+
+One requests.Session per upstream, shared by every thread: connections (and
+their TLS sessions) are kept alive in a pool of up to `pool_maxsize` per
+host instead of being opened for each call as module-level requests.get()
+does. requests only speaks HTTP/1.1; async_client() gives the async server
+an httpx client that negotiates HTTP/2 when the h2 package is installed
+(HTTP2=0 turns that off).
+
+requests and httpx are imported by the first call that needs them, so
+importing this module costs nothing at startup.
+"""
+import importlib.util
+import os
+
+# hosts each session keeps a pool for
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 4))
+HTTP2 = os.environ.get('HTTP2', '1') != '0' and importlib.util.find_spec('h2') is not None
+
+
+def pooled_session(pool_maxsize=10, pool_connections=POOL_CONNECTIONS):
+    """requests.Session keeping up to `pool_maxsize` connections per host alive; safe to share between threads"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def async_client(max_connections, timeout):
+    """httpx.AsyncClient with a keep-alive pool of `max_connections`, on HTTP/2 where available"""
+    import httpx
+    return httpx.AsyncClient(
+        timeout=timeout,
+        http2=HTTP2,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+
+def connection_stats(session):
+    """Requests sent and connections opened so far through a pooled_session() (None: not created yet)"""
+    sent = opened = 0
+    adapters = session.adapters.values() if session is not None else ()
+    for adapter in {id(a): a for a in adapters}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                sent += pool.num_requests
+                opened += pool.num_connections
+    return {
+        "requests": sent,
+        "connections": opened,
+        "reuse_ratio": round(1 - opened / sent, 4) if sent else None,
+    }
@@ -0,0 +1,206 @@
+"""
+Fast JSON encoding, pre-serialized rows and response negotiation
+
+dumps() uses orjson when it is installed and the stdlib json module
+otherwise (JSON_ENCODER=json forces the stdlib). JSONProvider plugs the same
+encoder into Flask's jsonify.
+
+RowCache keeps the serialized bytes of booking rows so list responses are
+assembled by joining bytes; entries are dropped when the booking changes.
+
+encode_body() applies conditional requests and compression to a JSON body:
+a weak ETag that does not depend on the encoding, 304 when If-None-Match
+matches, and br (when brotli is installed) or gzip per Accept-Encoding.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'orjson' if orjson is not None else 'json')
+if JSON_ENCODER == 'orjson' and orjson is None:
+    raise RuntimeError("JSON_ENCODER=orjson needs orjson (pip install orjson)")
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _default(value):
+    # datetimes (which orjson handles itself) and NumPy scalars
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# built once: json.dumps() with options builds a new encoder on every call
+_stdlib_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=_default)
+
+
+def dumps(value):
+    """Compact JSON bytes for a value"""
+    if JSON_ENCODER == 'orjson':
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return _stdlib_encoder.encode(value).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider serializing with dumps()"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+class RowCache:
+    """
+    Serialized bytes of booking rows per (container number, fields), bounded to max_entries
+
+    A reader may serialize a booking read just before it changed and finish
+    after invalidate() ran, so rows are only stored when their booking has
+    not been invalidated since the reader took generation(), before reading
+    the bookings.
+    """
+
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._keys = {}
+        self._generation = 0
+        # generation of each booking's last invalidation
+        self._changed = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self):
+        """Take before reading bookings to serialize; pass to get() and get_many()"""
+        with self._lock:
+            return self._generation
+
+    def get(self, container, fields, generation=None):
+        """JSON bytes of the booking projected on `fields`"""
+        return self.get_many([container], fields, generation)[0]
+
+    def get_many(self, containers, fields, generation=None):
+        """JSON bytes of each booking projected on `fields`, in order, as read at `generation`"""
+        keys = [(container['container_number'], fields) for container in containers]
+        with self._lock:
+            if generation is None:
+                generation = self._generation
+            rows = list(map(self._rows.get, keys))
+        missing = [i for i, row in enumerate(rows) if row is None]
+        for i in missing:
+            container = containers[i]
+            rows[i] = dumps({field: container.get(field) for field in fields})
+
+        with self._lock:
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+            for i in missing:
+                if self._changed.get(keys[i][0], 0) > generation:
+                    # changed while being serialized; the row may be stale
+                    continue
+                if len(self._rows) >= self.max_entries:
+                    self._evict(next(iter(self._rows)))
+                self._rows[keys[i]] = rows[i]
+                self._keys.setdefault(keys[i][0], set()).add(fields)
+        return rows
+
+    def _evict(self, key):
+        # Caller must hold self._lock
+        del self._rows[key]
+        field_sets = self._keys.get(key[0])
+        if field_sets is not None:
+            field_sets.discard(key[1])
+            if not field_sets:
+                del self._keys[key[0]]
+
+    def invalidate(self, container_number):
+        """Forget every serialized row of a booking that changed"""
+        with self._lock:
+            self._generation += 1
+            self._changed[container_number] = self._generation
+            for fields in self._keys.pop(container_number, ()):
+                self._rows.pop((container_number, fields), None)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+def etag(body):
+    return 'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    # weak comparison: W/"x" and "x" name the same representation
+    return '*' in candidates or tag in candidates or tag[2:] in candidates
+
+
+def negotiate_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encode_body(body, accept_encoding=None, if_none_match=None):
+    """(status, body, headers) for a 200 JSON body after ETag and compression negotiation"""
+    tag = etag(body)
+    headers = {'ETag': tag, 'Vary': 'Accept-Encoding'}
+    if etag_matches(if_none_match, tag):
+        return 304, b'', headers
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    return 200, body, headers
@@ -0,0 +1,186 @@
+"""
+Local stand-in for the ULIP staging API, for benchmarks and offline runs
+
+    python mock_ulip.py --port 5100 --latency lognormal:0.2,0.5 --error-rate 0.01 --token-ttl 300
+    ULIP_BASE_URL=http://localhost:5100/ulip/v1.0.0 python start_api.py
+
+Implements /user/login and /LDB/01 with the response shape that
+start_api.extract_container_details parses. Every call is delayed by a sample
+from the latency distribution, a fraction of calls fail with 503, and tokens
+stop being accepted (401) after --token-ttl seconds. GET /__stats returns how
+many calls each endpoint received.
+
+Latency distributions, all in seconds:
+    0.2 or fixed:0.2      constant
+    uniform:LOW,HIGH
+    normal:MEAN,STDDEV    clipped at zero
+    lognormal:MEDIAN,SIGMA
+    exp:MEAN
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = '/ulip/v1.0.0'
+
+
+TRAIL_STEPS = (
+    ("FACTORY STUFFING", "ICD TUGHLAKABAD", "28.5040", "77.2790"),
+    ("RAIL OUT", "ICD TUGHLAKABAD", "28.5040", "77.2790"),
+    ("RAIL IN", "JNPT", "18.9500", "72.9500"),
+    ("GATE IN", "JNPT", "18.9500", "72.9500"),
+)
+
+
+def container_trail(container_number):
+    """LDB/01 response with a trail of events derived from the container number, the last one in last_event"""
+    digest = int(hashlib.md5(container_number.encode()).hexdigest(), 16)
+    timestamp = datetime(2023, 1, 1) + timedelta(minutes=digest % (90 * 24 * 60))
+    events = [{
+        "timestamptimezone": (timestamp - timedelta(hours=12 * (len(TRAIL_STEPS) - 1 - i))).strftime("%Y-%m-%d %H:%M:%S"),
+        "eventname": eventname,
+        "currentlocation": location,
+        "latitude": latitude,
+        "longitude": longitude,
+    } for i, (eventname, location, latitude, longitude) in enumerate(TRAIL_STEPS)]
+    return {
+        "error": "false",
+        "code": "200",
+        "response": [{
+            "request": {"containerNumber": container_number},
+            "response": {
+                "eximContainerTrail": {
+                    "cntrDetail": {"cntrno": container_number},
+                    "trail": events,
+                    "last_event": [events[-1]],
+                }
+            },
+        }],
+    }
+
+
+def latency_sampler(spec):
+    """Callable returning one latency sample (seconds) for a distribution spec"""
+    spec = str(spec)
+    kind, _, params = spec.partition(':')
+    if not params:
+        kind, params = 'fixed', kind
+    values = [float(v) for v in params.split(',')]
+
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == 'exp':
+        return lambda: random.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockULIPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, token_ttl=None):
+        super().__init__(address, MockULIPHandler)
+        self.sample_latency = latency_sampler(latency)
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.tokens = {}
+        self.counts = {"login": 0, "ldb": 0, "unauthorized": 0, "errors": 0}
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        expires_at = time.monotonic() + self.token_ttl if self.token_ttl else math.inf
+        with self.lock:
+            self.tokens[token] = expires_at
+        return token
+
+    def token_valid(self, token):
+        with self.lock:
+            return self.tokens.get(token, 0) > time.monotonic()
+
+
+class MockULIPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # as real servers do; otherwise Nagle stalls every reused keep-alive connection ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            with self.server.lock:
+                self._send(200, dict(self.server.counts))
+        else:
+            self._send(404, {"error": "true", "code": "404"})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(self.server.sample_latency())
+
+        if self.path not in (PREFIX + '/user/login', PREFIX + '/LDB/01'):
+            self._send(404, {"error": "true", "code": "404"})
+            return
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.server.count("errors")
+            self._send(503, {"error": "true", "code": "503", "message": "Service Unavailable"})
+            return
+
+        if self.path == PREFIX + '/user/login':
+            self.server.count("login")
+            token = self.server.issue_token()
+            self._send(200, {"error": "false", "code": "200", "response": {"id": token}})
+        else:
+            self.server.count("ldb")
+            token = self.headers.get('Authorization', '').replace('Bearer ', '', 1)
+            if not self.server.token_valid(token):
+                self.server.count("unauthorized")
+                self._send(401, {"error": "true", "code": "401", "message": "Unauthorized"})
+                return
+            self._send(200, container_trail(body.get('containerNumber', '')))
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the ULIP staging API")
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--latency', default='0', help="latency distribution, see module docstring")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument('--token-ttl', type=float, default=None, help="seconds before a token gets 401")
+    args = parser.parse_args()
+
+    server = MockULIPServer(('127.0.0.1', args.port), latency=args.latency,
+                            error_rate=args.error_rate, token_ttl=args.token_ttl)
+    print(f"Mock ULIP listening on http://127.0.0.1:{args.port}{PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Ingestion of OCR gate reads in bulk
+
+Gates post bursts of reads, often the same container seen several times as
+it passes. OCRIngestor validates each read, queues it in a bounded queue and
+returns at once. One consumer thread takes whatever has queued up (up to
+`max_batch` reads), drops reads of a container already seen at the same gate
+within `dedup_window` seconds, and hands the rest to `apply_batch` in one
+call. When the queue has no room for a request's reads, the request is
+refused with an estimate of when to retry rather than stalling the gate.
+"""
+import queue
+import re
+import string
+import threading
+import time
+
+from booking_store import parse_timestamp
+
+# ISO 6346 letter values: counting from A=10, skipping multiples of 11
+_LETTER_VALUES = {}
+_value = 10
+for _letter in string.ascii_uppercase:
+    if _value % 11 == 0:
+        _value += 1
+    _LETTER_VALUES[_letter] = _value
+    _value += 1
+
+CONTAINER_NUMBER = re.compile(r'^[A-Z]{3}[UJZ][0-9]{7}$')
+
+
+def iso6346_check_digit(code):
+    """Check digit for the first ten characters of a container number"""
+    total = sum((_LETTER_VALUES[c] if c.isalpha() else int(c)) << i for i, c in enumerate(code[:10]))
+    return total % 11 % 10
+
+
+def is_valid_container_number(container_number):
+    """True for a well-formed ISO 6346 container number with a correct check digit"""
+    return (isinstance(container_number, str) and CONTAINER_NUMBER.match(container_number) is not None
+            and iso6346_check_digit(container_number) == int(container_number[10]))
+
+
+class QueueFull(Exception):
+    """No room for the reads; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"OCR queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class OCRIngestor:
+    """Bounded queue plus one consumer that dedups OCR reads and applies them in batches"""
+
+    def __init__(self, apply_batch, queue_size=10000, dedup_window=30, min_confidence=0.8,
+                 max_batch=500, batch_wait=0.05):
+        self._apply_batch = apply_batch
+        self.dedup_window = dedup_window
+        self.min_confidence = min_confidence
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._submit_lock = threading.Lock()
+        self._last_seen = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._lock = threading.Lock()
+        self.received = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.applied = 0
+        self.batches = 0
+        self.refused = 0
+        self._apply_rate = 0.0
+
+    def validate(self, event):
+        """The read normalised to (gate_id, container_number, epoch, confidence); raises ValueError"""
+        if not isinstance(event, dict):
+            raise ValueError("Each event must be an object")
+        container_number = str(event.get('container_number', '')).strip().upper()
+        if not is_valid_container_number(container_number):
+            raise ValueError(f"Invalid ISO 6346 container number: {event.get('container_number')!r}")
+
+        confidence = event.get('confidence', 1.0)
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+            raise ValueError("confidence must be a number between 0 and 1")
+        if confidence < self.min_confidence:
+            raise ValueError(f"confidence {confidence} is below {self.min_confidence}")
+
+        timestamp = event.get('timestamp')
+        if timestamp is None:
+            epoch = time.time()
+        elif isinstance(timestamp, bool):
+            raise ValueError("timestamp must be ISO 8601 or epoch seconds")
+        elif isinstance(timestamp, (int, float)):
+            epoch = float(timestamp)
+        else:
+            try:
+                # naive times are gate-local, read in BOOKING_TZ like the booking times
+                epoch = parse_timestamp(str(timestamp).strip())
+            except ValueError:
+                raise ValueError("timestamp must be ISO 8601 or epoch seconds")
+        return str(event.get('gate_id', '')), container_number, epoch, confidence
+
+    def submit(self, events):
+        """
+        Validate and queue reads; returns (accepted count, [(index, error), ...])
+
+        Raises QueueFull, queueing nothing, when the valid reads do not fit.
+        """
+        valid = []
+        errors = []
+        for index, event in enumerate(events):
+            try:
+                valid.append(self.validate(event))
+            except ValueError as e:
+                errors.append((index, str(e)))
+
+        with self._lock:
+            self.received += len(events)
+            self.invalid += len(errors)
+
+        # one submitter at a time, so the room checked is still there when putting
+        with self._submit_lock:
+            if self._queue.maxsize - self._queue.qsize() < len(valid):
+                with self._lock:
+                    self.refused += len(valid)
+                raise QueueFull(self.retry_after())
+            for item in valid:
+                self._queue.put_nowait(item)
+        return len(valid), errors
+
+    def retry_after(self):
+        """Whole seconds until the queue is expected to have drained"""
+        with self._lock:
+            rate = self._apply_rate
+        depth = self._queue.qsize()
+        return max(1, int(depth / rate) + 1) if rate else 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ocr-ingest', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def drain(self, timeout=None):
+        """Wait until everything queued so far has been applied; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def _run(self):
+        next_prune = time.monotonic() + self.dedup_window
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            # let a burst fill the batch before applying it
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            try:
+                self._apply(batch)
+            except Exception as e:
+                print(f"OCR ingest error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                rate = len(batch) / elapsed if elapsed > 0 else 0.0
+                self._apply_rate = rate if not self._apply_rate else 0.8 * self._apply_rate + 0.2 * rate
+
+            if time.monotonic() >= next_prune:
+                self._prune()
+                next_prune = time.monotonic() + self.dedup_window
+
+    def _apply(self, batch):
+        fresh = {}
+        duplicates = 0
+        for gate_id, container_number, epoch, confidence in sorted(batch, key=lambda item: item[2]):
+            key = (gate_id, container_number)
+            last = self._last_seen.get(key)
+            if last is not None and epoch - last < self.dedup_window:
+                duplicates += 1
+                continue
+            self._last_seen[key] = epoch
+            # the first read of a container in the batch is its arrival
+            if container_number not in fresh:
+                fresh[container_number] = {'gate_id': gate_id, 'container_number': container_number,
+                                           'epoch': epoch, 'confidence': confidence}
+            else:
+                duplicates += 1
+        applied = self._apply_batch(list(fresh.values())) if fresh else 0
+        with self._lock:
+            self.duplicates += duplicates
+            self.applied += applied or 0
+            self.batches += 1
+
+    def _prune(self):
+        cutoff = time.time() - self.dedup_window
+        for key, epoch in list(self._last_seen.items()):
+            if epoch < cutoff:
+                del self._last_seen[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "received": self.received,
+                "invalid": self.invalid,
+                "duplicates": self.duplicates,
+                "applied": self.applied,
+                "batches": self.batches,
+                "refused": self.refused,
+                "queued": self._queue.qsize(),
+                "apply_rate": round(self._apply_rate, 1),
+            }
@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` operations per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=1):
+        if not rate > 0:
+            raise ValueError(f"TokenBucket rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Caller must hold self._lock
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; otherwise return the seconds until they will be"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, stop=None):
+        """Block until tokens are available; returns False if `stop` (an Event) gets set"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
@@ -0,0 +1,241 @@
+"""
+State shared by API worker processes through one SQLite database
+
+    BOOKING_STORE=bookings.db SHARED_STATE=shared.db gunicorn -w 4 start_api:app
+
+Bookings already live in the SQLite booking store. This database holds what
+each worker used to keep to itself:
+
+    tokens    the ULIP Bearer token, so workers do not each log in
+    details   ULIP container details with the time until which they are fresh
+    changes   a feed of changes (booking events, refreshed details) that other
+              workers apply to their in-process caches and event streams
+    leases    named leases, so only one worker runs the ETA refresh scheduler
+
+Workers notice each other's commits through PRAGMA data_version, which costs
+no I/O while nothing changed, so it is checked on every request as well as by
+a background thread that keeps event streams moving between requests. The
+database is a cache, so commits use synchronous=NORMAL.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    name TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS details (
+    container_number TEXT PRIMARY KEY,
+    details TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    fresh_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT,
+    payload TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SharedState:
+    """Token, details cache, change feed and leases shared between worker processes"""
+
+    def __init__(self, path, poll_interval=0.1, retention=600):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+
+        conn = self._conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self._handlers = {}
+        self._poll_lock = threading.Lock()
+        self._poll_conn = self._connect()
+        self._data_version = None
+        self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.polls = 0
+        self.applied = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def _conn(self):
+        # one connection per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # token store used by ulip_auth.TokenManager
+
+    def load_token(self, name='ulip'):
+        """(token, seconds left) of a token another worker logged in with, or None"""
+        row = self._conn.execute("SELECT token, expires_at FROM tokens WHERE name = ?", (name,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0], row[1] - time.time()
+
+    def save_token(self, token, ttl, name='ulip'):
+        with self._conn as conn:
+            conn.execute("INSERT OR REPLACE INTO tokens (name, token, expires_at) VALUES (?, ?, ?)",
+                         (name, token, time.time() + ttl))
+
+    def discard_token(self, token, name='ulip'):
+        with self._conn as conn:
+            conn.execute("DELETE FROM tokens WHERE name = ? AND token = ?", (name, token))
+
+    # container details
+
+    def get_details(self, container_number):
+        """Details some worker fetched that are still fresh, or None"""
+        row = self._conn.execute("SELECT details, fresh_until FROM details WHERE container_number = ?",
+                                 (container_number,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def put_details(self, container_number, details, fresh_for):
+        """Share freshly fetched details and tell other workers to drop their copy"""
+        now = time.time()
+        with self._conn as conn:
+            conn.execute("INSERT OR REPLACE INTO details (container_number, details, stored_at, fresh_until) "
+                         "VALUES (?, ?, ?, ?)", (container_number, json.dumps(details), now, now + fresh_for))
+            self._append_change(conn, 'details', container_number, None)
+
+    # change feed
+
+    def publish(self, kind, key=None, payload=None):
+        """Record a change for the other workers' `kind` handlers"""
+        with self._conn as conn:
+            self._append_change(conn, kind, key, payload)
+
+    def _append_change(self, conn, kind, key, payload):
+        conn.execute("INSERT INTO changes (origin, kind, key, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                     (self.origin, kind, key, json.dumps(payload) if payload is not None else None, time.time()))
+
+    def subscribe(self, kind, handler):
+        """Call `handler(key, payload)` for every `kind` change made by another worker"""
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def poll(self):
+        """Apply changes other workers committed since the last poll; returns how many"""
+        if not self._poll_lock.acquire(blocking=False):
+            # another thread is already applying them
+            return 0
+        try:
+            version = self._poll_conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return 0
+            self._data_version = version
+            self.polls += 1
+            rows = self._poll_conn.execute(
+                "SELECT seq, origin, kind, key, payload FROM changes WHERE seq > ? ORDER BY seq",
+                (self._last_seq,)).fetchall()
+            applied = 0
+            for seq, origin, kind, key, payload in rows:
+                self._last_seq = seq
+                if origin == self.origin:
+                    continue
+                for handler in self._handlers.get(kind, ()):
+                    try:
+                        handler(key, json.loads(payload) if payload is not None else None)
+                    except Exception as e:
+                        print(f"Shared change error for {kind} {key}: {str(e)}")
+                applied += 1
+            self.applied += applied
+            return applied
+        finally:
+            self._poll_lock.release()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='shared-state', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        next_trim = 0
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+                if time.time() >= next_trim:
+                    with self._conn as conn:
+                        conn.execute("DELETE FROM changes WHERE created_at < ?", (time.time() - self.retention,))
+                    next_trim = time.time() + 60
+            except sqlite3.Error as e:
+                print(f"Shared state error: {str(e)}")
+
+    # leases
+
+    def try_lease(self, name, ttl):
+        """Take or renew the lease `name` for `ttl` seconds; True if this worker holds it"""
+        now = time.time()
+        with self._conn as conn:
+            conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (name, self.origin, now + ttl, now))
+            owner = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()[0]
+        return owner == self.origin
+
+    def lease(self, name, ttl=30):
+        return Lease(self, name, ttl)
+
+    def stats(self):
+        return {"origin": self.origin, "polls": self.polls, "changes_applied": self.applied,
+                "last_seq": self._last_seq}
+
+
+class Lease:
+    """A lease held while `held()` keeps being called; renewed every third of its ttl"""
+
+    def __init__(self, shared, name, ttl=30):
+        self.shared = shared
+        self.name = name
+        self.ttl = ttl
+        self._held = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def held(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at >= self.ttl / 3:
+                try:
+                    self._held = self.shared.try_lease(self.name, self.ttl)
+                except sqlite3.Error as e:
+                    print(f"Lease error for {self.name}: {str(e)}")
+                    self._held = False
+                self._checked_at = now
+            return self._held
@@ -0,0 +1,88 @@
+"""
+Single-flight deduplication of concurrent calls
+
+    flight = SingleFlight()
+    flight.do(key, lambda: fetch(key))               # from threads
+    await flight.do_async(key, lambda: afetch(key))  # from coroutines
+
+The first caller for a key runs the function; callers arriving for the same
+key while it runs wait for it and get the same result or exception instead
+of running it again. Nothing is cached: once the call returns, the next
+caller for the key runs it anew. Threads and coroutines keep separate
+in-flight calls but share the counters.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Concurrent calls for the same key share one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _join(self, calls, key, new_future):
+        with self._lock:
+            future = calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = calls[key] = new_future()
+            self.executions += 1
+            return future, True
+
+    def _finish(self, calls, key):
+        with self._lock:
+            del calls[key]
+
+    def do(self, key, fn):
+        """fn(), or the result of the call for `key` another thread is already running"""
+        future, leader = self._join(self._calls, key, Future)
+        if not leader:
+            return future.result()
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(self._calls, key)
+            future.set_exception(e)
+            raise
+        self._finish(self._calls, key)
+        future.set_result(value)
+        return value
+
+    async def do_async(self, key, fn):
+        """await fn(), or the result of the call for `key` another coroutine is already awaiting"""
+        import asyncio
+        future, leader = self._join(self._tasks, key, asyncio.get_running_loop().create_future)
+        if not leader:
+            # a waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            self._finish(self._tasks, key)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._finish(self._tasks, key)
+            future.set_exception(e)
+            # retrieved here so asyncio does not log it when nobody else waited
+            future.exception()
+            raise
+        self._finish(self._tasks, key)
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
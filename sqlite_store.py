@@ -0,0 +1,298 @@
+"""
+Persistent booking store on SQLite
+
+    BOOKING_STORE=bookings.db python start_api.py
+    python sqlite_store.py import bookings.db bookings.csv [more.jsonl ...]
+
+Same interface as booking_store.BookingStore, but records live in a SQLite
+database in WAL mode, so OCR gate events survive restarts and can be read by
+several worker processes. Time fields are stored both as the original string
+and as epoch seconds, with indexes on container_number and the epoch columns.
+
+All writes go through one writer thread that commits whatever has queued up
+since its last commit in a single transaction, so a burst of gate events
+costs one fsync instead of one per event. Every caller still waits for its
+own write to be committed.
+"""
+import csv
+import json
+import queue
+import sqlite3
+import sys
+import threading
+
+from booking_store import BOOKING_FIELDS as FIELDS
+from booking_store import INDEXED_TIME_FIELDS, TIME_FIELDS, Booking, format_timestamp, to_epoch
+
+EPOCH_COLUMNS = {field: f"{field}_epoch" for field in INDEXED_TIME_FIELDS}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    container_number TEXT PRIMARY KEY,
+    booking_time TEXT NOT NULL,
+    expected_arrival_time TEXT,
+    new_expected_arrival_time TEXT,
+    gate_arrival_time TEXT,
+    status TEXT NOT NULL DEFAULT 'Pending',
+    time_difference REAL,
+    booking_time_epoch REAL,
+    expected_arrival_time_epoch REAL
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_booking_time ON bookings (booking_time_epoch, container_number);
+CREATE INDEX IF NOT EXISTS idx_bookings_expected_arrival ON bookings (expected_arrival_time_epoch, container_number);
+"""
+
+COLUMNS = FIELDS + tuple(EPOCH_COLUMNS.values())
+SELECT_COLUMNS = ', '.join(FIELDS)
+INSERT_SQL = (f"INSERT OR REPLACE INTO bookings ({', '.join(COLUMNS)}) "
+              f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+GET_SQL = f"SELECT {SELECT_COLUMNS} FROM bookings WHERE container_number = ?"
+RANGE_SQL = {
+    field: f"SELECT {SELECT_COLUMNS} FROM bookings WHERE {column} BETWEEN ? AND ? "
+           f"ORDER BY {column}, container_number"
+    for field, column in EPOCH_COLUMNS.items()
+}
+RANGE_AFTER_SQL = {
+    field: f"SELECT {SELECT_COLUMNS} FROM bookings WHERE {column} BETWEEN ? AND ? "
+           f"AND ({column}, container_number) > (?, ?) ORDER BY {column}, container_number"
+    for field, column in EPOCH_COLUMNS.items()
+}
+
+
+def _row_params(booking):
+    return tuple(booking.get(field) for field in FIELDS) + tuple(
+        to_epoch(booking.get(field)) for field in EPOCH_COLUMNS)
+
+
+def _update_statement(container_number, changes):
+    assignments = dict(changes)
+    # times may come as epoch seconds or datetimes; the text columns keep the booking format
+    for field in TIME_FIELDS:
+        if field in changes:
+            epoch = to_epoch(changes[field])
+            assignments[field] = None if epoch is None else format_timestamp(int(epoch))
+    for field, column in EPOCH_COLUMNS.items():
+        if field in changes:
+            assignments[column] = to_epoch(changes[field])
+    columns = sorted(assignments)
+    sql = f"UPDATE bookings SET {', '.join(f'{c} = ?' for c in columns)} WHERE container_number = ?"
+    return sql, tuple(assignments[c] for c in columns) + (container_number,)
+
+
+class _GroupCommitWriter(threading.Thread):
+    """Single writer thread committing all queued statements per transaction"""
+
+    def __init__(self, connect, max_batch=1000):
+        super().__init__(name='sqlite-writer', daemon=True)
+        self._connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self.commits = 0
+        self.writes = 0
+
+    def execute(self, sql, params):
+        """Run one write statement and return its rowcount once committed"""
+        return self.execute_many([(sql, params)])[0]
+
+    def execute_many(self, statements):
+        """Run (sql, params) write statements, normally in one commit; returns their rowcounts"""
+        items = [[sql, params, threading.Event(), None, None] for sql, params in statements]
+        for item in items:
+            self._queue.put(item)
+        for item in items:
+            item[2].wait()
+            if item[4] is not None:
+                raise item[4]
+        return [item[3] for item in items]
+
+    def stop(self):
+        self._queue.put(None)
+        self.join()
+
+    def run(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # take everything that queued up while the last commit was running
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                with conn:
+                    for item in batch:
+                        item[3] = conn.execute(item[0], item[1]).rowcount
+            except sqlite3.Error:
+                # one bad statement must not fail the others, so retry them one by one
+                for item in batch:
+                    try:
+                        with conn:
+                            item[3] = conn.execute(item[0], item[1]).rowcount
+                    except sqlite3.Error as e:
+                        item[4] = e
+            self.commits += 1
+            self.writes += len(batch)
+            for item in batch:
+                item[2].set()
+        conn.close()
+
+
+class SQLiteBookingStore:
+    """Booking records in a SQLite database, with the BookingStore interface"""
+
+    def __init__(self, path, bookings=()):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self._writer = _GroupCommitWriter(self._connect)
+        self._writer.start()
+
+        if bookings and not len(self):
+            self.add_many(bookings)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @property
+    def _conn(self):
+        # one read connection per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+
+    def __contains__(self, container_number):
+        return self._conn.execute("SELECT 1 FROM bookings WHERE container_number = ?",
+                                  (container_number,)).fetchone() is not None
+
+    def __iter__(self):
+        return (Booking.from_dict(dict(row)) for row in self._conn.execute(f"SELECT {SELECT_COLUMNS} FROM bookings"))
+
+    def get(self, container_number):
+        """Booking record for a container number, or None"""
+        row = self._conn.execute(GET_SQL, (container_number,)).fetchone()
+        return Booking.from_dict(dict(row)) if row is not None else None
+
+    def add(self, booking):
+        """Insert a new booking, replacing any existing one for the same container"""
+        self._writer.execute(INSERT_SQL, _row_params(booking))
+
+    def add_many(self, bookings, chunk_size=50000):
+        """Bulk insert in large transactions, bypassing the writer queue; returns the count"""
+        conn = self._connect()
+        count = 0
+        try:
+            chunk = []
+            for booking in bookings:
+                chunk.append(_row_params(booking))
+                if len(chunk) >= chunk_size:
+                    with conn:
+                        conn.executemany(INSERT_SQL, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                with conn:
+                    conn.executemany(INSERT_SQL, chunk)
+                count += len(chunk)
+        finally:
+            conn.close()
+        return count
+
+    def remove(self, container_number):
+        booking = self.get(container_number)
+        if booking is not None:
+            self._writer.execute("DELETE FROM bookings WHERE container_number = ?", (container_number,))
+        return booking
+
+    def update(self, container_number, **changes):
+        """Apply field changes to a booking and return the updated record, or None"""
+        unknown = set(changes) - set(FIELDS[1:])
+        if unknown:
+            raise KeyError(f"Unknown booking fields: {', '.join(sorted(unknown))}")
+        if not changes:
+            return self.get(container_number)
+        updated = self._writer.execute(*_update_statement(container_number, changes))
+        return self.get(container_number) if updated else None
+
+    def update_many(self, updates):
+        """Apply (container_number, changes) pairs in one commit; returns the updated records"""
+        updates = list(updates)
+        for _, changes in updates:
+            unknown = set(changes) - set(FIELDS[1:])
+            if unknown:
+                raise KeyError(f"Unknown booking fields: {', '.join(sorted(unknown))}")
+        rowcounts = self._writer.execute_many(
+            _update_statement(container_number, changes) for container_number, changes in updates if changes)
+        rowcounts = iter(rowcounts)
+        return [self.get(container_number) if not changes or next(rowcounts) else None
+                for container_number, changes in updates]
+
+    def range(self, field, start, end):
+        """Bookings whose `field` lies in [start, end], in time order"""
+        return list(self.iter_range(field, start, end))
+
+    def iter_range(self, field, start, end, after=None):
+        """
+        Yield bookings whose `field` lies in [start, end], in time order
+
+        Rows are read from the database as they are consumed. `after` is an
+        (epoch, container_number) key to resume strictly after.
+        """
+        if after is None:
+            rows = self._conn.execute(RANGE_SQL[field], (to_epoch(start), to_epoch(end)))
+        else:
+            rows = self._conn.execute(RANGE_AFTER_SQL[field], (to_epoch(start), to_epoch(end)) + tuple(after))
+        for row in rows:
+            yield Booking.from_dict(dict(row))
+
+    def import_csv(self, path):
+        """Bulk load bookings from a CSV file with a header row of booking fields"""
+        with open(path, newline='') as f:
+            return self.add_many({k: (v if v != '' else None) for k, v in row.items()}
+                                 for row in csv.DictReader(f))
+
+    def import_jsonl(self, path):
+        """Bulk load bookings from a file with one JSON object per line"""
+        with open(path) as f:
+            return self.add_many(json.loads(line) for line in f if line.strip())
+
+    def stats(self):
+        return {"bookings": len(self), "writes": self._writer.writes, "commits": self._writer.commits}
+
+    def close(self):
+        self._writer.stop()
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] != 'import':
+        print("usage: python sqlite_store.py import <database> <file.csv|file.jsonl> [...]")
+        sys.exit(1)
+    store = SQLiteBookingStore(sys.argv[2])
+    for path in sys.argv[3:]:
+        count = store.import_jsonl(path) if path.endswith(('.jsonl', '.ndjson')) else store.import_csv(path)
+        print(f"Imported {count} bookings from {path}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,128 @@
 import flask
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import datetime, timedelta
-import requests
 import json
-import random
+import os
+import base64
+import threading
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from ulip_auth import TokenManager
+from ttl_cache import TTLCache
+from single_flight import SingleFlight
+from booking_store import BOOKING_FIELDS, BookingStore, format_timestamp, to_epoch
+from sqlite_store import SQLiteBookingStore
+from shared_state import SharedState
+from event_bus import EventBus
+from eta_scheduler import ETARefreshScheduler
+from ulip_client import CircuitBreaker, RetryBudget, ULIPClient
+from ocr_ingest import OCRIngestor, QueueFull
+from trail_store import SQLiteTrailStore, TrailStore
+from admission import PRIORITIES, AdmissionController, Rejected
+import http_pool
+import json_codec
+import metrics
+from metrics import REGISTRY, span
 
 app = Flask(__name__)
+# jsonify through orjson when it is installed
+app.json = json_codec.JSONProvider(app)
+
+# per-route request metrics, served at /metrics; METRICS=0 turns the hooks off
+METRICS = os.environ.get('METRICS', '1') != '0'
+HTTP_REQUESTS = REGISTRY.counter('vbs_http_requests_total', 'HTTP requests handled', ['method', 'route', 'status'])
+HTTP_SECONDS = REGISTRY.histogram('vbs_http_request_seconds', 'Time to produce an HTTP response',
+                                  ['method', 'route', 'status'])
+HTTP_IN_FLIGHT = REGISTRY.gauge('vbs_http_requests_in_flight', 'HTTP requests being handled', ['route'])
+
+def request_route():
+    """Route pattern of the current request, so metrics do not get one series per container"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    if METRICS:
+        request.metrics_start = time.perf_counter()
+        request.metrics_spans = metrics.start_request_spans()
+        HTTP_IN_FLIGHT.labels(route=request_route()).inc()
+
+@app.after_request
+def record_request_metrics(response):
+    start = getattr(request, 'metrics_start', None)
+    if start is not None:
+        labels = {'method': request.method, 'route': request_route(), 'status': response.status_code}
+        HTTP_SECONDS.labels(**labels).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(**labels).inc()
+        if request.metrics_spans:
+            response.headers['Server-Timing'] = metrics.server_timing(request.metrics_spans)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if getattr(request, 'metrics_start', None) is not None:
+        HTTP_IN_FLIGHT.labels(route=request_route()).dec()
+        metrics.end_request_spans()
+
+# admission control: gate writes first, then status lookups, then list queries,
+# with NDJSON streams and status batches limited apart as bulk requests;
+# per-client rate limits only where ADMISSION_RATE_<CLASS> is set. ADMISSION=0 turns it off
+ADMISSION = os.environ.get('ADMISSION', '1') != '0'
+# header naming the client when a trusted proxy sets one, else the remote address
+ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER')
+ROUTE_PRIORITY = {
+    'update_container_ocr': 'ocr',
+    'ingest_ocr_events': 'ocr',
+    'get_container_status': 'status',
+    'update_container_arrival_time': 'status',
+    'get_container_trail': 'status',
+    'get_containers': 'list',
+    'get_containers_status_batch': 'bulk',
+    'get_delay_analytics': 'list',
+}
+admission = AdmissionController(
+    slots=int(os.environ.get('ADMISSION_SLOTS', 8)),
+    rates={cls: float(os.environ[f'ADMISSION_RATE_{cls.upper()}'])
+           for cls in PRIORITIES if f'ADMISSION_RATE_{cls.upper()}' in os.environ},
+    bursts={cls: int(os.environ[f'ADMISSION_BURST_{cls.upper()}'])
+            for cls in PRIORITIES if f'ADMISSION_BURST_{cls.upper()}' in os.environ},
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 5)),
+    ocr_reserve=int(os.environ['ADMISSION_OCR_RESERVE']) if 'ADMISSION_OCR_RESERVE' in os.environ else None,
+    bulk_slots=int(os.environ.get('ADMISSION_BULK_SLOTS', 4)),
+)
+
+def wants_ndjson():
+    return request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+def request_priority():
+    priority = ROUTE_PRIORITY.get(request.endpoint)
+    # a stream holds its slot until the client has read it all
+    if priority == 'list' and request.endpoint == 'get_containers' and wants_ndjson():
+        return 'bulk'
+    return priority
+
+def client_id():
+    if ADMISSION_CLIENT_HEADER:
+        return request.headers.get(ADMISSION_CLIENT_HEADER) or request.remote_addr
+    return request.remote_addr
+
+@app.before_request
+def admit_request():
+    priority = request_priority() if ADMISSION else None
+    if priority is None:
+        return None
+    try:
+        with span('admission'):
+            request.admission_ticket = admission.acquire(priority, client_id())
+    except Rejected as e:
+        return jsonify({"error": e.message}), e.status, {'Retry-After': str(e.retry_after)}
+
+@app.teardown_request
+def release_admission(error=None):
+    ticket = getattr(request, 'admission_ticket', None)
+    if ticket is not None:
+        admission.release(ticket)
 
 #container bookings to simulate VBS 
 CONTAINER_BOOKINGS = [
@@ -56,9 +173,85 @@ CONTAINER_BOOKINGS = [
     },
 ]
 
-def get_auth_token():
-    """Get authentication token from ULIP API"""
-    url = "https://www.ulipstaging.dpiit.gov.in/ulip/v1.0.0/user/login"
+# indexed view over the bookings, all lookups and updates go through it.
+# BOOKING_STORE=<path> keeps them in SQLite instead, seeded on first run
+BOOKING_STORE = os.environ.get('BOOKING_STORE')
+if BOOKING_STORE:
+    bookings = SQLiteBookingStore(BOOKING_STORE, CONTAINER_BOOKINGS)
+else:
+    bookings = BookingStore(CONTAINER_BOOKINGS)
+
+# every trail event ULIP has reported per container; kept in SQLite with the
+# bookings when BOOKING_STORE is set, or elsewhere with TRAIL_STORE=<path>
+TRAIL_STORE = os.environ.get('TRAIL_STORE', BOOKING_STORE)
+container_trails = SQLiteTrailStore(TRAIL_STORE) if TRAIL_STORE else TrailStore()
+
+# SHARED_STATE=<path> lets several worker processes (gunicorn -w N, uvicorn
+# --workers N) share the ULIP token and details and see each other's changes.
+# Bookings must then be in SQLite too, or each worker would have its own.
+SHARED_STATE = os.environ.get('SHARED_STATE')
+if SHARED_STATE and not BOOKING_STORE:
+    raise RuntimeError("SHARED_STATE needs BOOKING_STORE so that workers share bookings")
+shared_state = SharedState(SHARED_STATE) if SHARED_STATE else None
+
+@app.before_request
+def sync_shared_state():
+    """Apply other workers' changes before handling the request"""
+    if shared_state is not None:
+        shared_state.poll()
+
+ULIP_BASE_URL = os.environ.get('ULIP_BASE_URL', 'https://www.ulipstaging.dpiit.gov.in/ulip/v1.0.0')
+
+# worker pool for batch status lookups, and a keep-alive pool sized to match
+BATCH_WORKERS = int(os.environ.get('ULIP_BATCH_WORKERS', 16))
+BATCH_MAX_CONTAINERS = int(os.environ.get('ULIP_BATCH_MAX_CONTAINERS', 1000))
+BATCH_ITEM_TIMEOUT = float(os.environ.get('ULIP_BATCH_ITEM_TIMEOUT', 10))
+
+ULIP_POOL_SIZE = int(os.environ.get('ULIP_POOL_SIZE', BATCH_WORKERS))
+
+# timeouts, retries, circuit breaker and optional hedging for every ULIP call.
+# Every ULIP call, from any thread, reuses one pool of keep-alive connections,
+# set up (and requests imported) by the first call.
+ulip_client = ULIPClient(
+    lambda: http_pool.pooled_session(pool_maxsize=ULIP_POOL_SIZE),
+    connect_timeout=float(os.environ.get('ULIP_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('ULIP_READ_TIMEOUT', 10)),
+    max_retries=int(os.environ.get('ULIP_MAX_RETRIES', 2)),
+    hedge_after=float(os.environ['ULIP_HEDGE_AFTER']) if os.environ.get('ULIP_HEDGE_AFTER') else None,
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('ULIP_BREAKER_FAILURES', 5)),
+        reset_timeout=float(os.environ.get('ULIP_BREAKER_RESET', 30)),
+    ),
+    retry_budget=RetryBudget(ratio=float(os.environ.get('ULIP_RETRY_BUDGET', 0.2))),
+)
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='ulip-batch')
+
+# status changes pushed to /api/containers/events subscribers
+container_events = EventBus()
+SSE_HEARTBEAT = 15
+
+# serialized /api/containers rows, dropped when their booking changes
+row_cache = json_codec.RowCache(max_entries=int(os.environ.get('ROW_CACHE_ENTRIES', 200000)))
+
+def publish_booking_change(event_type, container):
+    """Tell event stream subscribers, in this and other workers, that a booking changed"""
+    data = {field: container.get(field) for field in BOOKING_FIELDS}
+    data['booking_epoch'] = container.booking_epoch
+    container_events.publish(event_type, **data)
+    row_cache.invalidate(container['container_number'])
+    update_delay_columns(container)
+    if shared_state is not None:
+        shared_state.publish('booking', container['container_number'], dict(data, type=event_type))
+
+def apply_shared_booking_change(container_number, event):
+    container_events.publish(event.pop('type'), **event)
+    row_cache.invalidate(container_number)
+    update_delay_columns(event)
+
+def login():
+    """Log in to ULIP and return the Bearer token (expiry unknown, so None)"""
+    url = f"{ULIP_BASE_URL}/user/login"
     payload = {
         "username": "docker_usr",
         "password": "docker@28112024"
@@ -67,32 +260,43 @@ def get_auth_token():
         'Content-Type': 'application/json',
         'Accept': 'application/json'
     }
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        if data.get('error') == 'false' and data.get('code') == '200':
-            return f"Bearer {data['response']['id']}"
-        raise Exception("Authentication failed")
-    except Exception as e:
-        print(f"Authentication error: {str(e)}")
-        return None
 
-def get_container_info(container_number, auth_token):
+    response = ulip_client.post('login', url, headers=headers, json=payload)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('error') == 'false' and data.get('code') == '200':
+        return f"Bearer {data['response']['id']}", None
+    raise Exception("Authentication failed")
+
+# one cached token shared by every request
+token_manager = TokenManager(login, shared=shared_state)
+
+def get_auth_token():
+    """Get authentication token from ULIP API"""
+    return token_manager.get_token()
+
+def get_container_info(container_number, auth_token, timeout=None):
     """Get container information from ULIP API"""
-    url = "https://www.ulipstaging.dpiit.gov.in/ulip/v1.0.0/LDB/01"
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-        'Authorization': auth_token
-    }
+    url = f"{ULIP_BASE_URL}/LDB/01"
     payload = {"containerNumber": container_number}
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
+        for attempt in range(2):
+            headers = {
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+                'Authorization': auth_token
+            }
+            response = ulip_client.post('ldb', url, headers=headers, json=payload, timeout=timeout, hedge=True)
+            if response.status_code == 401 and attempt == 0:
+                # token expired upstream before we expected, log in again once
+                token_manager.invalidate(auth_token)
+                auth_token = token_manager.refresh(stale_token=auth_token)
+                if not auth_token:
+                    return None
+                continue
+            response.raise_for_status()
+            return response.json()
     except Exception as e:
         print(f"Container info error: {str(e)}")
         return None
@@ -127,53 +331,200 @@ def extract_container_details(container_data):
         print(f"Error extracting container details: {str(e)}")
         return None
 
+def extract_trail_events(container_data):
+    """Every event in the eximContainerTrail of a ULP api response (last_event included)"""
+    try:
+        trail = container_data['response'][0]['response']['eximContainerTrail']
+    except (KeyError, IndexError, TypeError):
+        return []
+    events = []
+    for value in trail.values():
+        if isinstance(value, list):
+            events.extend(item for item in value if isinstance(item, dict) and 'eventname' in item)
+    return events
+
+def record_trail(container_number, container_data):
+    """Merge the trail events of a ULP api response into container_trails"""
+    try:
+        with span('trail_store'):
+            container_trails.merge(container_number, extract_trail_events(container_data))
+    except Exception as e:
+        print(f"Trail store error: {str(e)}")
+
+class ULIPError(Exception):
+    """Container details could not be fetched; `stage` is auth, info or extract"""
+
+    def __init__(self, message, stage):
+        super().__init__(message)
+        self.message = message
+        self.stage = stage
+
+def fetch_container_details(container_number, timeout=None):
+    """Log in, call LDB/01 and extract the last event, raising ULIPError on failure"""
+    with span('ulip_auth'):
+        auth_token = get_auth_token()
+    if not auth_token:
+        raise ULIPError("Failed to get authentication token", 'auth')
+
+    with span('ulip_ldb'):
+        container_data = get_container_info(container_number, auth_token, timeout=timeout)
+    if not container_data:
+        raise ULIPError("Failed to get container information from API", 'info')
+
+    with span('extract_details'):
+        container_details = extract_container_details(container_data)
+    if not container_details:
+        raise ULIPError("Could not extract container details from API response", 'extract')
+    record_trail(container_number, container_data)
+    return container_details
+
+# extracted ULIP details per container number, served stale while refreshing
+details_cache = TTLCache(
+    ttl=float(os.environ.get('ULIP_DETAILS_TTL', 60)),
+    stale_ttl=float(os.environ.get('ULIP_DETAILS_STALE_TTL', 300)),
+    max_entries=int(os.environ.get('ULIP_DETAILS_MAX_ENTRIES', 10000)),
+    max_bytes=int(os.environ.get('ULIP_DETAILS_MAX_BYTES', 32 * 1024 * 1024)),
+)
+
+# concurrent lookups of a container that is not cached share one ULIP fetch
+details_flight = SingleFlight()
+
+def get_container_details(container_number, fresh=False, timeout=None):
+    """
+    Cached fetch_container_details; fresh=True always goes to ULIP
+
+    Concurrent calls for the same container (and freshness) share one fetch.
+    While the ULIP circuit breaker is not closed, a failed fetch falls back to
+    the last details cached for the container, however old.
+    """
+    try:
+        return details_cache.get_or_load(
+            container_number,
+            lambda: details_flight.do((container_number, fresh),
+                                      lambda: load_container_details(container_number, timeout, fresh)),
+            fresh=fresh)
+    except ULIPError:
+        last_known = stale_fallback(container_number, fresh)
+        if last_known is None:
+            raise
+        return last_known
+
+def load_container_details(container_number, timeout=None, fresh=False):
+    """Details another worker fetched recently, else fetch_container_details (and share the result)"""
+    if not fresh:
+        container_details = shared_details(container_number)
+        if container_details is not None:
+            return container_details
+    container_details = fetch_container_details(container_number, timeout)
+    share_details(container_number, container_details)
+    return container_details
+
+def shared_details(container_number):
+    """Fresh details from the shared state, or None"""
+    if shared_state is None:
+        return None
+    with span('shared_details'):
+        return shared_state.get_details(container_number)
+
+def share_details(container_number, container_details, fresh_for=None):
+    """Hand details to the other workers; they drop their own cached copy"""
+    if shared_state is not None:
+        shared_state.put_details(container_number, container_details, fresh_for or details_cache.ttl)
+
+def stale_fallback(container_number, fresh=False):
+    """Last-known details to serve while ULIP is failing, or None"""
+    if fresh or ulip_client.breaker.state == CircuitBreaker.CLOSED:
+        return None
+    last_known = details_cache.get(container_number)
+    if last_known is not None:
+        ulip_client.record_stale_fallback()
+    return last_known
+
+def wants_fresh():
+    """True when the caller asked to bypass cached ULIP data"""
+    cache_control = request.headers.get('Cache-Control', '').lower()
+    return 'no-cache' in cache_control or request.args.get('fresh') in ('1', 'true')
+
+def refresh_eta(container):
+    """Fetch fresh ULIP details for a booking and store its new arrival estimate"""
+    container_number = container['container_number']
+    container_details = fetch_container_details(container_number)
+    details_cache.set(container_number, container_details)
+    # other workers can use these until the next scheduled refresh
+    interval = eta_scheduler.refresh_interval(container.expected_arrival_epoch - time.time())
+    share_details(container_number, container_details, fresh_for=interval * 1.2)
+    apply_arrival_time_update(container, container_details)
+
+# keeps arrival estimates of upcoming bookings fresh so status reads stay local
+eta_scheduler = ETARefreshScheduler(
+    bookings,
+    refresh_eta,
+    horizon=float(os.environ.get('ETA_REFRESH_HORIZON_HOURS', 48)) * 3600,
+    rate=float(os.environ.get('ETA_REFRESH_RATE', 2)),
+    # with several workers only the holder of this lease refreshes
+    leader=shared_state.lease('eta_refresh').held if shared_state is not None else None,
+)
+if os.environ.get('ETA_REFRESH', '1') != '0':
+    eta_scheduler.start()
+
+if shared_state is not None:
+    shared_state.subscribe('booking', apply_shared_booking_change)
+    shared_state.subscribe('details', lambda container_number, _: details_cache.invalidate(container_number))
+    shared_state.start()
+
+def scheduled_details(container_number):
+    """Container details kept current by the ETA scheduler, or None"""
+    if eta_scheduler.is_current(container_number):
+        with span('details_cache'):
+            return details_cache.get(container_number)
+    return None
+
 @app.route('/api/update_container_arrival_time/<container_number>', methods=['POST'])
 def update_container_arrival_time(container_number):
     """
     Update container's expected_arrival_time using ULIP API and calculate time difference
     """
-    # Get authentication token
-    auth_token = get_auth_token()
-    if not auth_token:
-        return jsonify({"error": "Failed to get authentication token"}), 500
-    
-    # Get container information from ULIP API
-    container_data = get_container_info(container_number, auth_token)
-    if not container_data:
-        return jsonify({"error": "Failed to get container information"}), 404
-    
-    # Extract container details
-    container_details = extract_container_details(container_data)
-    if not container_details:
-        return jsonify({"error": "Could not extract container details"}), 400
+    # Always go to ULIP here, the result also refreshes the details cache
+    try:
+        container_details = get_container_details(container_number, fresh=True)
+    except ULIPError as e:
+        return jsonify({"error": e.message}), {'auth': 500, 'info': 404, 'extract': 400}[e.stage]
     
     # Find the container in our local storage
-    container = next((c for c in CONTAINER_BOOKINGS if c['container_number'] == container_number), None)
+    container = bookings.get(container_number)
     
     if not container:
         return jsonify({"error": "Container not found in local storage"}), 404
     
-    if container_details['timestamptimezone']:
-        # Store the original expected_arrival_time
-        original_expected_time = datetime.fromisoformat(container['expected_arrival_time'])
-        
-        # Update new_expected_arrival_time
-        container['new_expected_arrival_time'] = container_details['timestamptimezone']
-        new_expected_time = datetime.fromisoformat(container_details['timestamptimezone'])
-        
-        # Calculate time difference
-        time_diff = (new_expected_time - original_expected_time).total_seconds() / 60  # in minutes
-        container['time_difference'] = time_diff
-        
-        return jsonify({
-            "message": "Container arrival time updated successfully",
-            "container_number": container_number,
-            "new_expected_arrival_time": container['new_expected_arrival_time'],
-            "time_difference": container['time_difference']
-        }), 200
+    result = apply_arrival_time_update(container, container_details)
+    if result:
+        return jsonify(result), 200
     
     return jsonify({"error": "No timestamp found in API response"}), 400
 
+def apply_arrival_time_update(container, container_details):
+    """Store the ULIP timestamp and time difference on a booking; None without a timestamp"""
+    if not container_details['timestamptimezone']:
+        return None
+
+    new_expected_epoch = to_epoch(container_details['timestamptimezone'])
+    
+    # Calculate time difference
+    time_diff = (new_expected_epoch - container.expected_arrival_epoch) / 60  # in minutes
+    
+    # Update new_expected_arrival_time
+    container = bookings.update(container.container_number,
+                                new_expected_arrival_time=new_expected_epoch,
+                                time_difference=time_diff)
+    publish_booking_change('arrival_time_updated', container)
+    
+    return {
+        "message": "Container arrival time updated successfully",
+        "container_number": container['container_number'],
+        "new_expected_arrival_time": container['new_expected_arrival_time'],
+        "time_difference": container['time_difference']
+    }
+
 
 
     
@@ -192,72 +543,267 @@ def get_containers():
     except ValueError:
         return jsonify({"error": "Invalid date format. Use ISO format."}), 400
     
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     # Filter containers within the specified time range
-    filtered_containers = [
-        {
-            "container_number": container['container_number'],
-            "booking_time": container['booking_time'],
-            "expected_arrival_time": container['expected_arrival_time']
-        }
-        for container in CONTAINER_BOOKINGS
-        if (start <= datetime.fromisoformat(container['booking_time']) <= end)
-    ]
+    generation = row_cache.generation()
+    rows = bookings.iter_range('booking_time', start, end, after=after)
+    
+    if wants_ndjson():
+        return Response(stream_with_context(stream_containers(rows, fields, limit, generation)),
+                        mimetype='application/x-ndjson')
     
-    return jsonify(filtered_containers)
+    with span('serialize'):
+        if limit is None:
+            body = b'[' + b','.join(row_cache.get_many(list(rows), fields, generation)) + b']'
+        else:
+            page = list(islice(rows, limit + 1))
+            next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+            body = (b'{"items":[' + b','.join(row_cache.get_many(page[:limit], fields, generation))
+                    + b'],"next_cursor":' + json_codec.dumps(next_cursor) + b'}')
+    return json_body_response(body)
 
-@app.route('/api/container/status/<container_number>', methods=['GET'])
-def get_container_status(container_number):
+def json_body_response(body):
+    """200 response for a JSON body, or 304 when the client's ETag matches; compressed if accepted"""
+    with span('encode'):
+        status, body, headers = json_codec.encode_body(
+            body, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+    return Response(body, status=status, headers=headers, content_type='application/json')
+
+# /api/containers returns these unless ?fields= asks for others
+CONTAINER_LIST_FIELDS = ('container_number', 'booking_time', 'expected_arrival_time')
+MAX_PAGE_SIZE = 10000
+
+def parse_fields(value):
+    if not value:
+        return CONTAINER_LIST_FIELDS
+    fields = tuple(field for field in value.split(',') if field)
+    unknown = [field for field in fields if field not in BOOKING_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Use any of {', '.join(BOOKING_FIELDS)}")
+    return fields
+
+def parse_limit(value):
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+def encode_cursor(container):
+    """Opaque paging cursor pointing just after this booking"""
+    key = [container.booking_epoch, container.container_number]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        epoch, container_number = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(epoch), str(container_number)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def stream_containers(rows, fields, limit, generation=None):
     """
-    Get detailed status of a specific container with real-time API data
-    
-    Checks for delays and current status, including latest expected arrival time from API
+    NDJSON lines for the rows as they are read from the store
+
+    When a limit cuts the window short, the last line is {"next_cursor": ...}.
     """
-    container = next((c for c in CONTAINER_BOOKINGS if c['container_number'] == container_number), None)
-    
-    if not container:
-        return jsonify({"error": "Container not found"}), 404
-    
-    # Get latest data from API
-    auth_token = get_auth_token()
-    if not auth_token:
-        return jsonify({"error": "Failed to get authentication token"}), 500
-    
-    container_data = get_container_info(container_number, auth_token)
-    if not container_data:
-        return jsonify({"error": "Failed to get container information from API"}), 500
-    
-    # Extract container details including new expected arrival time
-    container_details = extract_container_details(container_data)
-    if not container_details:
-        return jsonify({"error": "Could not extract container details from API response"}), 500
-    
-    # Get the original expected time
-    expected_time = datetime.fromisoformat(container['expected_arrival_time'])
-    current_time = datetime.now()
+    last = None
+    for count, container in enumerate(rows):
+        if limit is not None and count == limit:
+            yield json_codec.dumps({"next_cursor": encode_cursor(last)}) + b'\n'
+            return
+        last = container
+        yield row_cache.get(container, fields, generation) + b'\n'
+
+def build_container_status(container, container_details):
+    """Status payload for a booking combined with its ULIP details"""
+    # Times are epoch seconds, strings only in the response
+    expected_time = container.expected_arrival_epoch
+    current_time = time.time()
     
     # Get new expected time from API response
     new_expected_time = None
     time_difference = None
     if container_details['timestamptimezone']:
-        new_expected_time = container_details['timestamptimezone']
-        # Calculate time difference if we have a new expected time
-        api_expected_time = datetime.fromisoformat(new_expected_time)
-        time_difference = (api_expected_time - expected_time).total_seconds() / 60  # in minutes
+        # ULIP times carry an offset, parsing makes them comparable to the booking's
+        api_expected_time = to_epoch(container_details['timestamptimezone'])
+        new_expected_time = format_timestamp(int(api_expected_time))
+        time_difference = (api_expected_time - expected_time) / 60  # in minutes
     
     # Create status response with API data
     delay_status = {
-        "container_number": container_number,
+        "container_number": container['container_number'],
         "booking_time": container['booking_time'],
         "expected_arrival_time": container['expected_arrival_time'],
         "new_expected_arrival_time": new_expected_time,
         "time_difference": time_difference,
         "is_delayed": current_time > expected_time,
-        "delay_minutes": max(0, int((current_time - expected_time).total_seconds() / 60)) if current_time > expected_time else 0,
+        "delay_minutes": max(0, int((current_time - expected_time) / 60)) if current_time > expected_time else 0,
         "status": container['status'],
         "container_details": container_details 
     }
     
-    return jsonify(delay_status)
+    return delay_status
+
+@app.route('/api/container/status/<container_number>', methods=['GET'])
+def get_container_status(container_number):
+    """
+    Get detailed status of a specific container with real-time API data
+    
+    Checks for delays and current status, including latest expected arrival time from API
+    """
+    with span('booking_store'):
+        container = bookings.get(container_number)
+    
+    if not container:
+        return jsonify({"error": "Container not found"}), 404
+    
+    # Containers the ETA scheduler keeps fresh need no upstream call at all
+    fresh = wants_fresh()
+    container_details = None if fresh else scheduled_details(container_number)
+    
+    # Get latest data from API (cached, unless the client asked for fresh data)
+    if container_details is None:
+        try:
+            with span('container_details'):
+                container_details = get_container_details(container_number, fresh=fresh)
+        except ULIPError as e:
+            return jsonify({"error": e.message}), 500
+    
+    with span('build_status'):
+        status = build_container_status(container, container_details)
+    return json_body_response(json_codec.dumps(status))
+
+
+@app.route('/api/container/trail/<container_number>', methods=['GET'])
+def get_container_trail(container_number):
+    """
+    Trail events of a container in time order, from the local trail store
+
+    ULIP is asked only when nothing is stored for the container yet, or with
+    fresh=1 / Cache-Control: no-cache; its new events are merged in first.
+    `since` (ISO) returns only the events after that time.
+    """
+    with span('booking_store'):
+        container = bookings.get(container_number)
+    if not container:
+        return jsonify({"error": "Container not found"}), 404
+
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = to_epoch(since)
+        except ValueError:
+            return jsonify({"error": "Invalid date format. Use ISO format."}), 400
+
+    fresh = wants_fresh()
+    if fresh or container_number not in container_trails:
+        try:
+            # fetching the details merges the trail they came with
+            with span('container_details'):
+                get_container_details(container_number, fresh=fresh)
+        except ULIPError as e:
+            return jsonify({"error": e.message}), 500
+
+    with span('trail_store'):
+        events = container_trails.events(container_number, since=since)
+    return jsonify({
+        "container_number": container_number,
+        "since": request.args.get('since'),
+        "count": len(events),
+        "events": events,
+    })
+
+
+def resolve_batch_containers(data):
+    """Container numbers named by a batch request body, raising ValueError if invalid"""
+    if not isinstance(data, dict):
+        raise ValueError("The request body must be a JSON object")
+    if 'container_numbers' in data:
+        container_numbers = data['container_numbers']
+        if not isinstance(container_numbers, list):
+            raise ValueError("container_numbers must be a list")
+        if not all(isinstance(n, str) for n in container_numbers):
+            raise ValueError("container_numbers must be strings")
+    elif data.get('start_time') and data.get('end_time'):
+        try:
+            start = datetime.fromisoformat(data['start_time'])
+            end = datetime.fromisoformat(data['end_time'])
+        except (TypeError, ValueError):
+            raise ValueError("Invalid date format. Use ISO format.")
+        container_numbers = [c['container_number'] for c in bookings.range('booking_time', start, end)]
+    else:
+        raise ValueError("Either container_numbers or both start_time and end_time are required")
+
+    container_numbers = list(dict.fromkeys(container_numbers))
+    if len(container_numbers) > BATCH_MAX_CONTAINERS:
+        raise ValueError(f"At most {BATCH_MAX_CONTAINERS} containers per batch")
+    return container_numbers
+
+def batch_item_timeout(data):
+    """Per-container timeout of a batch request body, raising ValueError if invalid"""
+    timeout = data.get('timeout', BATCH_ITEM_TIMEOUT)
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not 0 < timeout < float('inf'):
+        raise ValueError("timeout must be a positive number of seconds")
+    return float(timeout)
+
+@app.route('/api/containers/status:batch', methods=['POST'])
+def get_containers_status_batch():
+    """
+    Status of many containers in one request
+
+    Takes either {"container_numbers": [...]} or {"start_time": ..., "end_time": ...}
+    and fetches the ULIP details concurrently. Containers that fail are reported
+    under "errors" without failing the whole batch.
+    """
+    data = request.json or {}
+
+    try:
+        container_numbers = resolve_batch_containers(data)
+        item_timeout = batch_item_timeout(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fresh = bool(data.get('fresh')) or wants_fresh()
+
+    results = {}
+    errors = {}
+    futures = {}
+    for container_number in container_numbers:
+        container = bookings.get(container_number)
+        if not container:
+            errors[container_number] = {"error": "Container not found", "status": 404}
+            continue
+        future = batch_executor.submit(get_container_details, container_number, fresh, item_timeout)
+        futures[future] = container
+
+    # every item has its own upstream timeout, this only bounds the queueing on top
+    rounds = -(-len(futures) // BATCH_WORKERS)
+    done, not_done = wait(futures, timeout=item_timeout * max(rounds, 1) + 1)
+
+    for future in done:
+        container = futures[future]
+        try:
+            results[container['container_number']] = build_container_status(container, future.result())
+        except ULIPError as e:
+            errors[container['container_number']] = {"error": e.message, "status": 500}
+        except Exception as e:
+            errors[container['container_number']] = {"error": str(e), "status": 500}
+    for future in not_done:
+        future.cancel()
+        errors[futures[future]['container_number']] = {"error": "Timed out waiting for ULIP", "status": 504}
+
+    return jsonify({"results": results, "errors": errors})
 
 
 @app.route('/api/ocr/update', methods=['POST'])
@@ -270,14 +816,290 @@ def update_container_ocr():
     if not data or 'container_number' not in data:
         return jsonify({"error": "Container number is required"}), 400
     
-    container = next((c for c in CONTAINER_BOOKINGS if c['container_number'] == data['container_number']), None)
+    with span('booking_store'):
+        container = bookings.update(data['container_number'],
+                                    gate_arrival_time=time.time(),
+                                    status='Arrived')
     
     if container:
-        container['gate_arrival_time'] = datetime.now().isoformat()
-        container['status'] = 'Arrived'
+        publish_booking_change('gate_arrival', container)
         return jsonify({"message": "Container status updated successfully"}), 200
     
     return jsonify({"error": "Container not found"}), 404
 
+def apply_gate_reads(reads):
+    """Mark booked containers Arrived at their first gate read; returns how many changed"""
+    updates = []
+    for read in reads:
+        container = bookings.get(read['container_number'])
+        # later reads (repeats past the dedup window, or from another worker) keep the first arrival
+        if container is None or container.status == 'Arrived':
+            continue
+        updates.append((read['container_number'], {
+            'gate_arrival_time': read['epoch'],
+            'status': 'Arrived',
+        }))
+    with span('booking_store'):
+        updated = [c for c in bookings.update_many(updates) if c]
+    for container in updated:
+        publish_booking_change('gate_arrival', container)
+    return len(updated)
+
+# bounded queue of OCR gate reads, deduped and applied in batches by one thread
+OCR_BATCH_SIZE = 500
+ocr_ingestor = OCRIngestor(
+    apply_gate_reads,
+    queue_size=int(os.environ.get('OCR_QUEUE_SIZE', 10000)),
+    dedup_window=float(os.environ.get('OCR_DEDUP_WINDOW', 30)),
+    min_confidence=float(os.environ.get('OCR_MIN_CONFIDENCE', 0.8)),
+    max_batch=OCR_BATCH_SIZE,
+)
+ocr_ingestor.start()
+
+def read_ndjson_events():
+    """Yield the request body's events in chunks, parsing one NDJSON line at a time"""
+    chunk = []
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunk.append(json.loads(line))
+        except ValueError:
+            chunk.append(None)
+        if len(chunk) >= OCR_BATCH_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+@app.route('/api/ocr/events', methods=['POST'])
+def ingest_ocr_events():
+    """
+    Queue a batch of OCR gate reads
+
+    The body is {"events": [...]}, a JSON list, or NDJSON (one event per line)
+    with Content-Type application/x-ndjson. Each event has container_number,
+    gate_id, timestamp (ISO 8601 or epoch seconds) and confidence (0-1). Reads
+    are applied shortly after the 202 answer. Events are queued OCR_BATCH_SIZE
+    at a time; when the queue is full the answer is 503 with Retry-After, and
+    `accepted` and `resume_at` say how many were queued before that, so the
+    gate can resend the rest.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        chunks = read_ndjson_events()
+    else:
+        data = request.get_json(silent=True)
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list):
+            return jsonify({"error": "Expected a list of events, {\"events\": [...]} or NDJSON"}), 400
+        chunks = (events[i:i + OCR_BATCH_SIZE] for i in range(0, len(events), OCR_BATCH_SIZE))
+
+    accepted = 0
+    offset = 0
+    rejected = []
+    try:
+        for chunk in chunks:
+            queued, errors = ocr_ingestor.submit(chunk)
+            rejected.extend({"index": offset + index, "error": error} for index, error in errors)
+            accepted += queued
+            offset += len(chunk)
+    except QueueFull as e:
+        response = jsonify({"error": str(e), "accepted": accepted, "resume_at": offset, "rejected": rejected})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    return jsonify({"accepted": accepted, "rejected": rejected, "queued": ocr_ingestor.stats()['queued']}), 202
+
+@app.route('/api/containers/events', methods=['GET'])
+def stream_container_events():
+    """
+    Server-sent events for status changes of containers booked in a time window
+
+    Sends gate_arrival (from OCR updates) and arrival_time_updated (new
+    time_difference) events as they happen, plus a heartbeat comment when idle.
+    """
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    start = end = None
+    if start_time or end_time:
+        try:
+            start = to_epoch(start_time)
+            end = to_epoch(end_time)
+        except (TypeError, ValueError):
+            start = end = None
+        if start is None or end is None:
+            return jsonify({"error": "Invalid date format. Use ISO format, and give both start_time and end_time."}), 400
+
+    subscription = container_events.subscribe(start, end)
+
+    def events():
+        try:
+            yield ': connected\n\n'
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT)
+                if event is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# columnar copy of the bookings for /api/analytics/delays, built once in the
+# background DELAY_COLUMNS_BUILD_AFTER seconds after startup (or by the first
+# request, if sooner; a negative value leaves it to that request) and then
+# kept current one booking at a time. delay_analytics (and NumPy) is only
+# imported by the build, so it does not slow startup.
+DELAY_COLUMNS_BUILD_AFTER = float(os.environ.get('DELAY_COLUMNS_BUILD_AFTER', 5))
+delay_columns = None
+# booking changes made while the columns are being built, applied after it
+delay_columns_pending = None
+delay_columns_lock = threading.Lock()
+delay_columns_build_lock = threading.Lock()
+
+def get_delay_columns():
+    """Delay columns for the current bookings, building them if that has not happened yet"""
+    global delay_columns, delay_columns_pending
+    if delay_columns is not None:
+        return delay_columns
+    import delay_analytics
+    with delay_columns_build_lock:
+        if delay_columns is None:
+            with delay_columns_lock:
+                delay_columns_pending = []
+            with span('build_columns'):
+                columns = delay_analytics.BookingColumns.from_bookings(bookings)
+            with delay_columns_lock:
+                for container in delay_columns_pending:
+                    columns.upsert(container)
+                delay_columns, delay_columns_pending = columns, None
+    return delay_columns
+
+def update_delay_columns(container):
+    with delay_columns_lock:
+        columns = delay_columns
+        if columns is None:
+            if delay_columns_pending is not None:
+                delay_columns_pending.append(container)
+            return
+    columns.upsert(container)
+
+def build_delay_columns():
+    try:
+        import delay_analytics
+        if delay_analytics.HAVE_NUMPY:
+            get_delay_columns()
+    except Exception as e:
+        print(f"Delay columns build error: {str(e)}")
+
+if DELAY_COLUMNS_BUILD_AFTER >= 0:
+    delay_columns_timer = threading.Timer(DELAY_COLUMNS_BUILD_AFTER, build_delay_columns)
+    delay_columns_timer.daemon = True
+    delay_columns_timer.start()
+
+@app.route('/api/analytics/delays', methods=['GET'])
+def get_delay_analytics():
+    """
+    Delay statistics for bookings in a time window
+
+    start_time and end_time (ISO) select bookings by `field` (expected_arrival_time
+    or booking_time). Returns the on-time rate (arrived within `on_time_minutes`,
+    default 15), delay and ULIP time difference percentiles, a delay histogram,
+    a breakdown per `bucket` (hour or day) and the `top` most delayed bookings.
+    """
+    import delay_analytics
+    if not delay_analytics.HAVE_NUMPY:
+        return jsonify({"error": "Delay analytics need NumPy (pip install numpy)"}), 501
+
+    try:
+        start = datetime.fromisoformat(request.args['start_time'])
+        end = datetime.fromisoformat(request.args['end_time'])
+    except KeyError:
+        return jsonify({"error": "Both start_time and end_time are required"}), 400
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use ISO format."}), 400
+
+    field = request.args.get('field', 'expected_arrival_time')
+    bucket = request.args.get('bucket', 'hour')
+    if field not in ('expected_arrival_time', 'booking_time'):
+        return jsonify({"error": "field must be expected_arrival_time or booking_time"}), 400
+    if bucket not in delay_analytics.BUCKET_SECONDS:
+        return jsonify({"error": "bucket must be hour or day"}), 400
+    try:
+        top = min(int(request.args.get('top', 20)), 1000)
+        on_time_minutes = float(request.args.get('on_time_minutes', 15))
+    except ValueError:
+        return jsonify({"error": "top and on_time_minutes must be numbers"}), 400
+    if top < 0:
+        return jsonify({"error": "top must not be negative"}), 400
+
+    columns = get_delay_columns()
+    with span('analytics'):
+        summary = columns.summary(start, end, field=field, bucket=bucket, top=top,
+                                  on_time_minutes=on_time_minutes)
+    return jsonify(summary)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    Internal counters for the ULIP token and details caches, the booking store
+    and the ULIP client (circuit breaker, retry budget, latency histograms)
+    """
+    return jsonify({
+        "auth_token": token_manager.stats(),
+        "container_details": details_cache.stats(),
+        "details_flight": details_flight.stats(),
+        "bookings": bookings.stats(),
+        "events": container_events.stats(),
+        "eta_refresh": eta_scheduler.stats(),
+        "ocr_ingest": ocr_ingestor.stats(),
+        "ulip": ulip_client.stats(),
+        "shared_state": shared_state.stats() if shared_state is not None else None,
+        "trails": container_trails.stats(),
+        "row_cache": row_cache.stats(),
+        "admission": admission.stats(),
+    })
+
+# counters the caches, store and scheduler already keep, read when /metrics is scraped
+REGISTRY.counter('vbs_details_cache_lookups_total', 'ULIP details cache lookups by result', ['result']).set_function(
+    lambda: {result: details_cache.stats()[key] for result, key in
+             (('hit', 'hits'), ('stale', 'stale_hits'), ('miss', 'misses'), ('bypass', 'bypasses'))})
+REGISTRY.gauge('vbs_details_cache_entries', 'ULIP details held in the cache').set_function(
+    lambda: details_cache.stats()['entries'])
+REGISTRY.gauge('vbs_details_cache_bytes', 'Estimated memory held by the details cache').set_function(
+    lambda: details_cache.stats()['bytes'])
+REGISTRY.counter('vbs_details_coalesced_total',
+                 'Details lookups that waited for a ULIP fetch of the same container already in flight').set_function(
+    lambda: details_flight.stats()['coalesced'])
+REGISTRY.counter('vbs_auth_token_refreshes_total', 'ULIP logins made by the token manager').set_function(
+    lambda: token_manager.stats()['refreshes'])
+REGISTRY.gauge('vbs_bookings', 'Bookings in the booking store').set_function(lambda: len(bookings))
+REGISTRY.gauge('vbs_event_subscribers', 'Open container event streams').set_function(
+    lambda: container_events.stats()['subscribers'])
+REGISTRY.counter('vbs_eta_refreshes_total', 'Background ETA refreshes by result', ['result']).set_function(
+    lambda: {'ok': eta_scheduler.stats()['refreshes'], 'error': eta_scheduler.stats()['failures']})
+REGISTRY.counter('vbs_ocr_reads_total', 'OCR gate reads by outcome', ['outcome']).set_function(
+    lambda: {outcome: ocr_ingestor.stats()[outcome]
+             for outcome in ('received', 'invalid', 'duplicates', 'applied', 'refused')})
+REGISTRY.gauge('vbs_ocr_queue_depth', 'OCR gate reads waiting to be applied').set_function(
+    lambda: ocr_ingestor.stats()['queued'])
+REGISTRY.gauge('vbs_admission_queued', 'Requests waiting for an admission slot', ['priority']).set_function(
+    lambda: {cls: stats['queued'] for cls, stats in admission.stats()['classes'].items()})
+REGISTRY.gauge('ulip_circuit_open', '1 while the ULIP circuit breaker is not closed').set_function(
+    lambda: int(ulip_client.breaker.state != CircuitBreaker.CLOSED))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Request, upstream, cache and stage timing metrics in the Prometheus text format
+    """
+    return Response(REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # no reloader: it imports this module a second time, starting a second ETA
+    # scheduler and OCR ingestor that would double the ULIP refresh traffic
+    app.run(debug=True, use_reloader=False, port=5000)
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Local history of ULIP container trail events
+
+    trails = TrailStore()                     # or SQLiteTrailStore('trails.db')
+    trails.merge('TRHU3282355', events)       # only unseen events are added
+    trails.events('TRHU3282355', since=1672531200)
+
+LDB/01 returns a container's whole trail every time it is asked. Each fetch
+is merged into an append-only log: an event is identified by its timestamp,
+event name and location, so repeated fetches add nothing and a refresh adds
+only what happened since. Events are kept per container in timestamp order,
+so the trail, or the part of it after a given time, is read locally.
+"""
+import bisect
+import sqlite3
+import threading
+
+from booking_store import to_epoch
+
+EVENT_FIELDS = ('timestamptimezone', 'eventname', 'currentlocation', 'latitude', 'longitude')
+KEY_FIELDS = ('timestamptimezone', 'eventname', 'currentlocation')
+
+
+def event_epoch(event):
+    """Epoch seconds of an event's timestamp, None if it has none or it cannot be read"""
+    try:
+        return to_epoch(event.get('timestamptimezone'))
+    except (TypeError, ValueError):
+        return None
+
+
+def event_key(event):
+    return tuple(event.get(field) or '' for field in KEY_FIELDS)
+
+
+def normalize_event(event):
+    """The stored form of a trail event: EVENT_FIELDS plus its epoch"""
+    normalized = {field: event.get(field) for field in EVENT_FIELDS}
+    normalized['epoch'] = event_epoch(event)
+    return normalized
+
+
+class TrailStore:
+    """Trail events per container in memory, deduplicated and ordered by time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trails = {}
+        self.merges = 0
+        self.added = 0
+
+    def __contains__(self, container_number):
+        with self._lock:
+            return container_number in self._trails
+
+    def merge(self, container_number, events):
+        """Add the events not already stored for the container; returns how many were added"""
+        with self._lock:
+            trail = self._trails.get(container_number)
+            if trail is None:
+                # only stored once it has an event, so an empty answer is asked again next time
+                trail = {'seen': set(), 'epochs': [], 'events': []}
+            added = 0
+            for event in events:
+                key = event_key(event)
+                if key in trail['seen']:
+                    continue
+                trail['seen'].add(key)
+                event = normalize_event(event)
+                # events without a readable time sort first and never match `since`
+                epoch = event['epoch'] if event['epoch'] is not None else float('-inf')
+                position = bisect.bisect_right(trail['epochs'], epoch)
+                trail['epochs'].insert(position, epoch)
+                trail['events'].insert(position, event)
+                added += 1
+            if added:
+                self._trails.setdefault(container_number, trail)
+            self.merges += 1
+            self.added += added
+            return added
+
+    def events(self, container_number, since=None):
+        """Stored events in time order, only those after `since` (epoch seconds) when given"""
+        with self._lock:
+            trail = self._trails.get(container_number)
+            if trail is None:
+                return []
+            start = 0 if since is None else bisect.bisect_right(trail['epochs'], since)
+            return [dict(event) for event in trail['events'][start:]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "containers": len(self._trails),
+                "events": sum(len(trail['events']) for trail in self._trails.values()),
+                "merges": self.merges,
+                "added": self.added,
+            }
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trail_events (
+    container_number TEXT NOT NULL,
+    timestamptimezone TEXT NOT NULL,
+    eventname TEXT NOT NULL,
+    currentlocation TEXT NOT NULL,
+    latitude TEXT,
+    longitude TEXT,
+    epoch REAL,
+    PRIMARY KEY (container_number, timestamptimezone, eventname, currentlocation)
+);
+CREATE INDEX IF NOT EXISTS idx_trail_events_epoch ON trail_events (container_number, epoch);
+"""
+
+INSERT_SQL = ("INSERT OR IGNORE INTO trail_events (container_number, timestamptimezone, eventname, "
+              "currentlocation, latitude, longitude, epoch) VALUES (?, ?, ?, ?, ?, ?, ?)")
+SELECT_SQL = ("SELECT timestamptimezone, eventname, currentlocation, latitude, longitude, epoch "
+              "FROM trail_events WHERE container_number = ?")
+
+
+class SQLiteTrailStore:
+    """Trail events in a SQLite table, with the TrailStore interface; may share the booking database"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._lock = threading.Lock()
+        self.merges = 0
+        self.added = 0
+
+    @property
+    def _conn(self):
+        # one connection per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def __contains__(self, container_number):
+        return self._conn.execute("SELECT 1 FROM trail_events WHERE container_number = ? LIMIT 1",
+                                  (container_number,)).fetchone() is not None
+
+    def merge(self, container_number, events):
+        """Add the events not already stored for the container; returns how many were added"""
+        rows = [(container_number,) + event_key(event) + (event.get('latitude'), event.get('longitude'),
+                                                          event_epoch(event)) for event in events]
+        conn = self._conn
+        before = conn.total_changes
+        with conn:
+            conn.executemany(INSERT_SQL, rows)
+        added = conn.total_changes - before
+        with self._lock:
+            self.merges += 1
+            self.added += added
+        return added
+
+    def events(self, container_number, since=None):
+        """Stored events in time order, only those after `since` (epoch seconds) when given"""
+        if since is None:
+            rows = self._conn.execute(SELECT_SQL + " ORDER BY epoch, rowid", (container_number,))
+        else:
+            rows = self._conn.execute(SELECT_SQL + " AND epoch > ? ORDER BY epoch, rowid",
+                                      (container_number, since))
+        # key fields are stored as '' when ULIP leaves them out
+        return [{field: (row[field] or None) if field in KEY_FIELDS else row[field]
+                 for field in EVENT_FIELDS + ('epoch',)} for row in rows]
+
+    def stats(self):
+        containers, events = self._conn.execute(
+            "SELECT COUNT(DISTINCT container_number), COUNT(*) FROM trail_events").fetchone()
+        with self._lock:
+            return {"containers": containers, "events": events, "merges": self.merges, "added": self.added}
@@ -0,0 +1,172 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Rough in-memory size of a cached value (dicts, lists and scalars)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(v) for v in value)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at", "size")
+
+    def __init__(self, value, size):
+        self.value = value
+        self.stored_at = time.monotonic()
+        self.size = size
+
+
+class TTLCache:
+    """
+    LRU cache with a time-to-live and stale-while-revalidate
+
+    Entries younger than `ttl` are served as hits. Entries older than `ttl` but
+    younger than `ttl + stale_ttl` are served immediately while one background
+    thread reloads them. Anything older is loaded synchronously. The cache is
+    bounded both by entry count and by an estimate of the memory it holds.
+    """
+
+    def __init__(self, ttl=60, stale_ttl=300, max_entries=10000, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def get_or_load(self, key, loader, fresh=False):
+        """
+        Return the cached value for `key`, calling `loader()` when needed
+
+        `fresh=True` skips the cache lookup but still stores the loaded value.
+        Exceptions from `loader` propagate and nothing is cached.
+        """
+        if fresh:
+            self.count_bypass()
+            return self._load(key, loader)
+
+        value, revalidate = self.lookup(key)
+        if value is None:
+            return self._load(key, loader)
+        if revalidate:
+            threading.Thread(target=self._revalidate, args=(key, loader), daemon=True).start()
+        return value
+
+    def lookup(self, key):
+        """
+        Cached value for `key` as `(value, revalidate)`, value being None on a miss
+
+        `revalidate` is True for the one caller that should reload a stale entry;
+        it must call finish_refresh() afterwards. Used by callers that load
+        values themselves, such as the async server.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value, False
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    revalidate = key not in self._refreshing
+                    if revalidate:
+                        self._refreshing.add(key)
+                    return entry.value, revalidate
+            self.misses += 1
+            return None, False
+
+    def count_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    def get(self, key, default=None):
+        """Return the cached value regardless of age, without loading"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else default
+
+    def _load(self, key, loader):
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def _revalidate(self, key, loader):
+        try:
+            self._load(key, loader)
+        except Exception as e:
+            print(f"Cache refresh error for {key}: {str(e)}")
+            self.finish_refresh(key, False)
+        else:
+            self.finish_refresh(key, True)
+
+    def finish_refresh(self, key, ok):
+        """Release a refresh claimed through lookup()"""
+        with self._lock:
+            self._refreshing.discard(key)
+            if ok:
+                self.refreshes += 1
+            else:
+                self.refresh_failures += 1
+
+    def set(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = _Entry(value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                "miss_ratio": round(self.misses / lookups, 4) if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
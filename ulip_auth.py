@@ -0,0 +1,160 @@
+import threading
+import time
+
+# ULIP does not report token lifetime in the login response, so assume a
+# conservative one and refresh a little before it runs out
+DEFAULT_TOKEN_TTL = 30 * 60
+DEFAULT_REFRESH_MARGIN = 2 * 60
+FAILED_REFRESH_RETRY = 30
+
+
+class TokenManager:
+    """
+    Cache the ULIP Bearer token and refresh it before it expires
+
+    `login` is a callable returning `(token, expires_in)` where expires_in may be
+    None to use the default TTL. It should raise on failure. Concurrent callers
+    that find no valid token share a single login call.
+
+    `shared` (e.g. shared_state.SharedState) lets several processes use one
+    token: a token another process saved is taken instead of logging in, and
+    new or rejected tokens are saved or discarded there too.
+    """
+
+    def __init__(self, login, ttl=DEFAULT_TOKEN_TTL, refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 background_refresh=True, shared=None):
+        self._login = login
+        self.shared = shared
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._inflight = None
+        self._timer = None
+
+        self.hits = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.coalesced = 0
+
+    def _valid_token(self):
+        # Caller must hold self._lock
+        if self._token and time.monotonic() < self._expires_at:
+            return self._token
+        return None
+
+    def get_token(self):
+        """Return a valid Bearer token, logging in only if none is cached"""
+        with self._lock:
+            token = self._valid_token()
+            if token:
+                self.hits += 1
+                return token
+        return self.refresh()
+
+    def peek(self):
+        """Cached token if still valid, else None; never logs in"""
+        with self._lock:
+            token = self._valid_token()
+            if token:
+                self.hits += 1
+            return token
+
+    def refresh(self, stale_token=None):
+        """
+        Log in again and return the new token, or None on failure
+
+        When `stale_token` is given and another caller has already replaced it,
+        the newer token is returned without logging in again.
+        """
+        with self._lock:
+            if stale_token is not None:
+                token = self._valid_token()
+                if token and token != stale_token:
+                    self.hits += 1
+                    return token
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = threading.Event()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            inflight.wait()
+            with self._lock:
+                return self._valid_token()
+
+        try:
+            token, expires_in = self._login_or_load(stale_token)
+        except Exception as e:
+            print(f"Authentication error: {str(e)}")
+            with self._lock:
+                self.failures += 1
+                self._inflight = None
+            inflight.set()
+            self._schedule_refresh(FAILED_REFRESH_RETRY)
+            return None
+
+        ttl = expires_in or self.ttl
+        with self._lock:
+            self._token = token
+            self._expires_at = time.monotonic() + ttl
+            self.refreshes += 1
+            self._inflight = None
+        inflight.set()
+        self._schedule_refresh(max(ttl - self.refresh_margin, 1))
+        return token
+
+    def _login_or_load(self, stale_token=None):
+        if self.shared is None:
+            return self._login()
+        loaded = self.shared.load_token()
+        # a background refresh close to expiry should log in rather than reload the same token
+        if loaded and loaded[0] != stale_token and loaded[0] != self._token and loaded[1] > self.refresh_margin:
+            return loaded
+        token, expires_in = self._login()
+        self.shared.save_token(token, expires_in or self.ttl)
+        return token, expires_in
+
+    def invalidate(self, token=None):
+        """Drop the cached token (only if it is still `token`, when given)"""
+        with self._lock:
+            if token is None or token == self._token:
+                if self.shared is not None and self._token:
+                    self.shared.discard_token(self._token)
+                self._token = None
+                self._expires_at = 0.0
+
+    def _schedule_refresh(self, delay):
+        if not self.background_refresh:
+            return
+        timer = threading.Timer(delay, self.refresh)
+        timer.daemon = True
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = timer
+        timer.start()
+
+    def close(self):
+        """Stop the background refresh timer"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def stats(self):
+        with self._lock:
+            remaining = max(0.0, self._expires_at - time.monotonic()) if self._token else 0.0
+            return {
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "coalesced": self.coalesced,
+                "token_valid": remaining > 0,
+                "expires_in_seconds": round(remaining, 1),
+            }
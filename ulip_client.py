@@ -0,0 +1,268 @@
+"""
+Resilient HTTP calls to ULIP
+
+ULIPClient wraps a requests.Session with per-call timeouts, retries with
+exponential backoff under a global retry budget, a circuit breaker and
+optional request hedging. Its breaker, budget and latency histograms (kept in
+the metrics registry) are also used by the async server so both modes account
+for upstream health together.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import http_pool
+from metrics import REGISTRY
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'ulip_upstream_request_seconds', 'Latency of single ULIP HTTP calls', ['endpoint'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+UPSTREAM_CALLS = REGISTRY.counter(
+    'ulip_upstream_requests_total', 'ULIP HTTP calls by outcome (ok, error or rejected)', ['endpoint', 'outcome'])
+
+
+class CircuitOpenError(Exception):
+    """ULIP is considered down and the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker
+
+    Opens after `failure_threshold` consecutive failures. While open every call
+    fails fast; after `reset_timeout` seconds one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """True if a call may go out now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_running:
+                self._state = self.HALF_OPEN
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class RetryBudget:
+    """
+    Caps retries (and hedges) at a fraction of recent calls
+
+    Over any `window` seconds, at most `ratio` extra attempts per call are
+    allowed, plus `min_per_second` so a quiet service can still retry.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1.0, window=10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._retries = deque()
+        self.exhausted = 0
+
+    def _trim(self, now):
+        for events in (self._calls, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_call(self):
+        with self._lock:
+            self._calls.append(time.monotonic())
+
+    def try_spend(self):
+        """Take one retry from the budget; False when it is used up"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowed = len(self._calls) * self.ratio + self.min_per_second * self.window
+            if len(self._retries) >= allowed:
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"calls": len(self._calls), "retries": len(self._retries), "exhausted": self.exhausted}
+
+
+class ULIPClient:
+    """
+    Timeouts, retries, circuit breaking and hedging around a requests.Session
+
+    Network errors, timeouts and 5xx answers count as failures and are retried
+    with full-jitter exponential backoff while the retry budget allows. Other
+    responses (including 401) are returned to the caller as they are. With
+    `hedge_after` set, a hedged call sends a second copy of a request that has
+    not answered within that many seconds and uses whichever answers first.
+
+    `session` may also be a function returning the session; it is then called
+    (and requests imported) on the first call rather than at startup.
+    """
+
+    def __init__(self, session, connect_timeout=3.05, read_timeout=10, max_retries=2,
+                 backoff_base=0.2, backoff_cap=2.0, hedge_after=None, breaker=None, retry_budget=None):
+        self._session_factory = session if callable(session) else None
+        self._session = None if callable(session) else session
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+
+        self._lock = threading.Lock()
+        self._endpoints = set()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='ulip-hedge') if hedge_after else None
+        self.hedges = 0
+        self.stale_fallbacks = 0
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._session_factory()
+        return self._session
+
+    def histogram(self, endpoint):
+        with self._lock:
+            self._endpoints.add(endpoint)
+        return UPSTREAM_SECONDS.labels(endpoint=endpoint)
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry number `attempt` (1-based)"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+    def post(self, endpoint, url, timeout=None, hedge=False, **kwargs):
+        """
+        POST through the breaker with retries; returns the final response
+
+        `endpoint` names the call for the latency histograms. `timeout` overrides
+        the read timeout. Raises CircuitOpenError without calling when the
+        circuit is open, or the last network error once retries run out.
+        """
+        kwargs['timeout'] = (self.connect_timeout, timeout or self.read_timeout)
+        session = self.session
+        import requests  # already loaded by the session, only bound here
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                UPSTREAM_CALLS.labels(endpoint=endpoint, outcome='rejected').inc()
+                raise CircuitOpenError("ULIP circuit is open")
+            self.retry_budget.record_call()
+            error = None
+            start = time.perf_counter()
+            try:
+                if hedge and self._hedge_pool is not None:
+                    response = self._hedged_post(session, url, kwargs)
+                else:
+                    response = session.post(url, **kwargs)
+            except requests.RequestException as e:
+                response, error = None, e
+            self.histogram(endpoint).observe(time.perf_counter() - start)
+
+            if response is not None and response.status_code < 500:
+                UPSTREAM_CALLS.labels(endpoint=endpoint, outcome='ok').inc()
+                self.breaker.record_success()
+                return response
+
+            UPSTREAM_CALLS.labels(endpoint=endpoint, outcome='error').inc()
+            self.breaker.record_failure()
+            attempt += 1
+            if attempt > self.max_retries or not self.retry_budget.try_spend():
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(self.backoff(attempt))
+
+    def _hedged_post(self, session, url, kwargs):
+        first = self._hedge_pool.submit(session.post, url, **kwargs)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done or not self.retry_budget.try_spend():
+            return first.result()
+
+        with self._lock:
+            self.hedges += 1
+        second = self._hedge_pool.submit(session.post, url, **kwargs)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return first.result()
+
+    def record_stale_fallback(self):
+        with self._lock:
+            self.stale_fallbacks += 1
+
+    def stats(self):
+        with self._lock:
+            endpoints = sorted(self._endpoints)
+            hedges, stale_fallbacks = self.hedges, self.stale_fallbacks
+        return {
+            "circuit_breaker": self.breaker.stats(),
+            "retry_budget": self.retry_budget.stats(),
+            "hedged_requests": hedges,
+            "stale_fallbacks": stale_fallbacks,
+            "latency_seconds": {endpoint: self.histogram(endpoint).stats() for endpoint in endpoints},
+            "connections": http_pool.connection_stats(self._session),
+        }
@@ -1,8 +1,25 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
 from datetime import datetime, timedelta
+import queue
 import threading
+import time
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import http_pool
+
+# rows requested per /api/containers page, more are loaded as the list is scrolled
+PAGE_SIZE = 500
+# how close to the bottom (as a fraction of the list) the next page is requested
+LOAD_MORE_AT = 0.9
+# how often the Tk thread picks up finished network calls, in ms
+UI_POLL_MS = 30
+# threads making backend calls; the event stream holds one more connection
+NETWORK_WORKERS = 4
+
+class ApiError(Exception):
+    """The backend answered with an error status"""
 
 class VehicleBookingSystemApp:
     def __init__(self, root):
@@ -13,6 +30,27 @@ class VehicleBookingSystemApp:
         # API Base URL (assuming local development)
         self.BASE_URL = "http://localhost:5000"
 
+        # All network calls run on this pool over one keep-alive session; results
+        # come back to the Tk thread through ui_queue, drained on a timer.
+        # The session (and requests) is set up on the pool once the window is up.
+        self._session = None
+        self.session_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=NETWORK_WORKERS, thread_name_prefix='vbs-net')
+        self.ui_queue = queue.Queue()
+
+        # Paging state of the containers list, and the latest status request.
+        # Responses for an older list fetch or selection are dropped.
+        self.list_generation = 0
+        self.next_cursor = None
+        self.page_loading = False
+        self.status_future = None
+        self.status_request = 0
+
+        # Rows by container number, updated in place from the server's event stream
+        self.tree_items = {}
+        self.selected_container = None
+        self.event_stream = None
+
         # Create main frame
         self.main_frame = ttk.Frame(root, padding="10")
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -33,8 +71,50 @@ class VehicleBookingSystemApp:
         # Container Details
         self.create_container_details_section()
 
-        # Additional Details Section (initially hidden)
-        self.create_additional_details_section()
+        # Additional Details Section, built the first time a delay is shown
+        self.additional_frame = None
+
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
+        self.root.after_idle(lambda: self.executor.submit(lambda: self.session))
+
+    @property
+    def session(self):
+        with self.session_lock:
+            if self._session is None:
+                self._session = http_pool.pooled_session(pool_maxsize=NETWORK_WORKERS + 1)
+            return self._session
+
+    def run_async(self, task, args, callback, on_error):
+        """Run task(*args) on the network pool and pass its result to callback on the Tk thread"""
+        future = self.executor.submit(task, *args)
+        future.add_done_callback(lambda f: self.ui_queue.put(lambda: self.deliver_result(f, callback, on_error)))
+        return future
+
+    def deliver_result(self, future, callback, on_error):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            on_error(error)
+        else:
+            callback(future.result())
+
+    def process_ui_queue(self):
+        # Runs on the Tk thread, so queued callbacks may touch widgets and show message boxes
+        while True:
+            try:
+                callback = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            callback()
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
+
+    def show_request_error(self, message, error):
+        import requests
+        if isinstance(error, requests.RequestException):
+            messagebox.showerror("Network Error", str(error))
+        else:
+            messagebox.showerror("Error", f"{message}: {error}")
 
     def create_time_range_section(self):
         # Time Range Frame
@@ -63,12 +143,18 @@ class VehicleBookingSystemApp:
 
         # Containers Treeview
         self.containers_tree = ttk.Treeview(containers_frame, 
-            columns=('Container Number', 'Expected Arrival'), 
+            columns=('Container Number', 'Expected Arrival', 'Status'), 
             show='headings'
         )
         self.containers_tree.heading('Container Number', text='Container Number')
         # self.containers_tree.heading('Booking Time', text='Booking Time')
         self.containers_tree.heading('Expected Arrival', text='Expected Arrival')
+        self.containers_tree.heading('Status', text='Status')
+
+        # Scrolling near the end of the list loads the next page
+        scrollbar = ttk.Scrollbar(containers_frame, orient=tk.VERTICAL, command=self.containers_tree.yview)
+        self.containers_tree.configure(yscrollcommand=lambda first, last: self.on_tree_scroll(scrollbar, first, last))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=5)
         self.containers_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
         # Bind selection event
@@ -100,7 +186,6 @@ class VehicleBookingSystemApp:
     def create_additional_details_section(self):
         # Additional Details Frame (Right Side)
         self.additional_frame = ttk.LabelFrame(self.right_frame, text="Additional Details")
-        self.additional_frame.pack(fill=tk.BOTH, expand=True, pady=10, padx=10)
 
         # Event Name
         ttk.Label(self.additional_frame, text="Event Name:").grid(row=0, column=0, sticky='w', padx=5, pady=5)
@@ -122,36 +207,132 @@ class VehicleBookingSystemApp:
         self.longitude_label = ttk.Label(self.additional_frame, text="")
         self.longitude_label.grid(row=3, column=1, sticky='w', padx=5, pady=5)
 
-        # Initially hide the additional frame
-        self.additional_frame.pack_forget()
+    def hide_additional_details(self):
+        if self.additional_frame is not None:
+            self.additional_frame.pack_forget()
 
     def fetch_containers(self):
         # Clear previous results
-        for i in self.containers_tree.get_children():
-            self.containers_tree.delete(i)
+        self.containers_tree.delete(*self.containers_tree.get_children())
+        self.tree_items = {}
+
+        # Start paging through the new time range
+        self.list_generation += 1
+        self.next_cursor = None
+        self.load_next_page(first=True)
+
+        # Follow status changes for the same window
+        self.subscribe_events(self.start_time_entry.get(), self.end_time_entry.get())
+
+    def load_next_page(self, first=False):
+        if self.page_loading and not first:
+            return
+        self.page_loading = True
 
         # Get time range
         start_time = self.start_time_entry.get()
         end_time = self.end_time_entry.get()
 
-        try:
-            # Make API call
-            response = requests.get(f"{self.BASE_URL}/api/containers", 
-                                 params={'start_time': start_time, 'end_time': end_time})
-            
-            if response.status_code == 200:
-                containers = response.json()
-                for container in containers:
-                    self.containers_tree.insert('', 'end', values=(
-                        container['container_number'], 
-                        container['booking_time'], 
-                        container['expected_arrival_time']
-                    ))
-            else:
-                messagebox.showerror("Error", f"Failed to fetch containers: {response.text}")
-        
-        except requests.RequestException as e:
-            messagebox.showerror("Network Error", str(e))
+        self.run_async(self.request_containers_page, (start_time, end_time, self.next_cursor),
+                       lambda page, generation=self.list_generation: self.add_containers_page(generation, page),
+                       lambda error, generation=self.list_generation: self.on_page_error(generation, error))
+
+    def request_containers_page(self, start_time, end_time, cursor):
+        # Runs on the network pool
+        params = {
+            'start_time': start_time,
+            'end_time': end_time,
+            'limit': PAGE_SIZE,
+            'fields': 'container_number,expected_arrival_time,status,time_difference'
+        }
+        if cursor:
+            params['cursor'] = cursor
+        response = self.session.get(f"{self.BASE_URL}/api/containers", params=params)
+        if response.status_code != 200:
+            raise ApiError(response.text)
+        return response.json()
+
+    def add_containers_page(self, generation, page):
+        if generation != self.list_generation:
+            return
+        self.page_loading = False
+        for container in page['items']:
+            self.tree_items[container['container_number']] = self.containers_tree.insert('', 'end', values=(
+                container['container_number'], 
+                container['expected_arrival_time'],
+                self.row_status(container)
+            ))
+        self.next_cursor = page['next_cursor']
+
+    def row_status(self, container):
+        if container.get('status') == 'Arrived':
+            return 'Arrived'
+        time_diff = container.get('time_difference')
+        if time_diff is None:
+            return container.get('status') or ''
+        return "On-time" if time_diff < 0 else f"Delayed: {time_diff:.0f} min"
+
+    def subscribe_events(self, start_time, end_time):
+        # Replace any stream for the previous window
+        if self.event_stream is not None:
+            self.event_stream.close()
+        generation = self.list_generation
+        threading.Thread(target=self.read_events, args=(generation, start_time, end_time), daemon=True).start()
+
+    def read_events(self, generation, start_time, end_time):
+        # Runs on its own thread for as long as this list is shown, reconnecting on errors
+        delay = 1
+        while generation == self.list_generation:
+            try:
+                response = self.session.get(f"{self.BASE_URL}/api/containers/events",
+                                            params={'start_time': start_time, 'end_time': end_time},
+                                            stream=True, timeout=(5, 60))
+                if generation != self.list_generation:
+                    response.close()
+                    return
+                self.event_stream = response
+                delay = 1
+                data = []
+                for line in response.iter_lines(decode_unicode=True):
+                    if generation != self.list_generation:
+                        response.close()
+                        return
+                    if line.startswith('data:'):
+                        data.append(line[5:].strip())
+                    elif not line and data:
+                        event = json.loads('\n'.join(data))
+                        data = []
+                        self.ui_queue.put(lambda event=event: self.apply_event(generation, event))
+            except Exception:
+                pass
+            if generation != self.list_generation:
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def apply_event(self, generation, event):
+        if generation != self.list_generation:
+            return
+        item = self.tree_items.get(event['container_number'])
+        if item is not None:
+            self.containers_tree.item(item, values=(
+                event['container_number'],
+                event['expected_arrival_time'],
+                self.row_status(event)
+            ))
+        if event['container_number'] == self.selected_container:
+            self.fetch_container_status(self.selected_container)
+
+    def on_page_error(self, generation, error):
+        if generation != self.list_generation:
+            return
+        self.page_loading = False
+        self.show_request_error("Failed to fetch containers", error)
+
+    def on_tree_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if self.next_cursor and not self.page_loading and float(last) >= LOAD_MORE_AT:
+            self.load_next_page()
 
     def on_container_select(self, event):
         # Get selected container
@@ -165,87 +346,34 @@ class VehicleBookingSystemApp:
         # Enable OCR Update button
         self.ocr_update_btn.config(state=tk.NORMAL)
 
-        # Fetch container status in a separate thread
-        threading.Thread(target=self.fetch_container_status, args=(container_number,), daemon=True).start()
+        # Fetch container status in the background
+        self.selected_container = container_number
+        self.fetch_container_status(container_number)
 
     def fetch_container_status(self, container_number):
-        try:
-            # Make API call
-            response = requests.get(f"{self.BASE_URL}/api/container/status/{container_number}")
-            
-            if response.status_code == 200:
-                status = response.json()
-                # Get container details from API
-                auth_token = self.get_auth_token()
-                if auth_token:
-                    container_info = self.get_container_info(container_number, auth_token)
-                    if container_info:
-                        container_details = self.extract_container_details(container_info)
-                        status['container_details'] = container_details
-                
-                # Update UI (use after to ensure thread-safe update)
-                self.root.after(0, self.update_container_status, status)
-            else:
-                messagebox.showerror("Error", f"Failed to fetch container status: {response.text}")
-        
-        except requests.RequestException as e:
-            messagebox.showerror("Network Error", str(e))
-
-    def get_auth_token(self):
-        """Get authentication token from ULIP API"""
-        url = "https://www.ulipstaging.dpiit.gov.in/ulip/v1.0.0/user/login"
-        payload = {
-            "username": "docker_usr",
-            "password": "docker@28112024"
-        }
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            if data.get('error') == 'false' and data.get('code') == '200':
-                return f"Bearer {data['response']['id']}"
-            return None
-        except Exception:
-            return None
-
-    def get_container_info(self, container_number, auth_token):
-        """Get container information from ULIP API"""
-        url = "https://www.ulipstaging.dpiit.gov.in/ulip/v1.0.0/LDB/01"
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Authorization': auth_token
-        }
-        payload = {"containerNumber": container_number}
-        
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
-
-    def extract_container_details(self, container_data):
-        """Extract relevant container details from API response"""
-        try:
-            if 'response' in container_data and container_data['response']:
-                first_response = container_data['response'][0]
-                last_event = first_response.get('response', {}).get('eximContainerTrail', {}).get('last_event', [{}])[0]
-                
-                return {
-                    'eventname': last_event.get('eventname', 'N/A'),
-                    'currentlocation': last_event.get('currentlocation', 'N/A'),
-                    'latitude': last_event.get('latitude', 'N/A'),
-                    'longitude': last_event.get('longitude', 'N/A')
-                }
-            return None
-        except Exception:
-            return None
+        # A newer selection supersedes any status request still in flight
+        if self.status_future is not None:
+            self.status_future.cancel()
+        self.status_request += 1
+        request_id = self.status_request
+
+        def on_status(status):
+            if request_id == self.status_request:
+                self.update_container_status(status)
+
+        def on_error(error):
+            if request_id == self.status_request:
+                self.show_request_error("Failed to fetch container status", error)
+
+        self.status_future = self.run_async(self.request_container_status, (container_number,),
+                                            on_status, on_error)
+
+    def request_container_status(self, container_number):
+        # Runs on the network pool; the backend adds the ULIP details
+        response = self.session.get(f"{self.BASE_URL}/api/container/status/{container_number}")
+        if response.status_code != 200:
+            raise ApiError(response.text)
+        return response.json()
 
     def update_container_status(self, status):
         # Update container details
@@ -257,12 +385,14 @@ class VehicleBookingSystemApp:
             if time_diff < 0:
                 self.time_diff_label.config(text="On-time", foreground="green")
                 self.ocr_update_btn.config(state=tk.NORMAL)  # Enable button when On-time
-                self.additional_frame.pack_forget()  # Hide additional details
+                self.hide_additional_details()
             else:
                 self.time_diff_label.config(text=f"Delayed: {time_diff:.2f} min", foreground="red")
                 self.ocr_update_btn.config(state=tk.DISABLED)  # Disable button when Delayed
                 
                 # Update additional details
+                if self.additional_frame is None:
+                    self.create_additional_details_section()
                 container_details = status.get('container_details', {})
                 self.event_name_label.config(text=container_details.get('eventname', 'N/A'))
                 self.current_location_label.config(text=container_details.get('currentlocation', 'N/A'))
@@ -274,7 +404,7 @@ class VehicleBookingSystemApp:
         else:
             self.time_diff_label.config(text="N/A", foreground="black")
             self.ocr_update_btn.config(state=tk.DISABLED)  # Disable button when N/A
-            self.additional_frame.pack_forget() 
+            self.hide_additional_details()
 
     def simulate_ocr_update(self):
         # Get selected container
@@ -285,20 +415,20 @@ class VehicleBookingSystemApp:
 
         container_number = self.containers_tree.item(selected_item)['values'][0]
 
-        try:
-            # Make OCR update API call
-            response = requests.post(f"{self.BASE_URL}/api/ocr/update", 
-                                  json={'container_number': container_number})
-            
-            if response.status_code == 200:
-                messagebox.showinfo("Success", f"Container ({container_number}) housed within the port facility!")
-                # Refresh container status
-                self.fetch_container_status(container_number)
-            else:
-                messagebox.showerror("Error", f"Failed to update OCR: {response.text}")
-        
-        except requests.RequestException as e:
-            messagebox.showerror("Network Error", str(e))
+        def on_updated(_):
+            messagebox.showinfo("Success", f"Container ({container_number}) housed within the port facility!")
+            # Refresh container status
+            self.fetch_container_status(container_number)
+
+        self.run_async(self.request_ocr_update, (container_number,), on_updated,
+                       lambda error: self.show_request_error("Failed to update OCR", error))
+
+    def request_ocr_update(self, container_number):
+        # Runs on the network pool
+        response = self.session.post(f"{self.BASE_URL}/api/ocr/update", 
+                              json={'container_number': container_number})
+        if response.status_code != 200:
+            raise ApiError(response.text)
 
 def main():
     root = tk.Tk()